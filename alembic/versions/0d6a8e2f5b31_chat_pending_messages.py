@@ -0,0 +1,39 @@
+"""chat pending messages
+
+Revision ID: 0d6a8e2f5b31
+Revises: b58d3e0a7c19
+Create Date: 2026-10-21 09:41:07.512934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d6a8e2f5b31'
+down_revision: Union[str, Sequence[str], None] = 'b58d3e0a7c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Unlogged: rows only live for a write-behind batch, and a crash loses the
+    # batches they describe anyway
+    op.create_table(
+        'chat_pending_messages',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('room_id', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        prefixes=['UNLOGGED'],
+    )
+    op.create_index('ix_chat_pending_messages_room_id_id', 'chat_pending_messages', ['room_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_pending_messages_room_id_id', table_name='chat_pending_messages')
+    op.drop_table('chat_pending_messages')
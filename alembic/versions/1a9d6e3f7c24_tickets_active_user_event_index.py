@@ -0,0 +1,31 @@
+"""tickets active user event index
+
+Revision ID: 1a9d6e3f7c24
+Revises: f2c7a94e1b58
+Create Date: 2026-10-19 17:05:41.286730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a9d6e3f7c24'
+down_revision: Union[str, Sequence[str], None] = 'f2c7a94e1b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_tickets_active_user_event', 'tickets', ['user_id', 'event_id'], unique=False,
+        postgresql_where=sa.text("refund_at IS NULL AND refund_id IS NULL AND payment_status = 'paid'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tickets_active_user_event', table_name='tickets')
@@ -0,0 +1,31 @@
+"""chat messages content search
+
+Revision ID: 4c8a2f6d1e93
+Revises: 7b3e5d1c9a42
+Create Date: 2026-10-19 20:26:03.771945
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8a2f6d1e93'
+down_revision: Union[str, Sequence[str], None] = '7b3e5d1c9a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_chat_messages_content_fts', 'chat_messages', [sa.text("to_tsvector('english', content)")], unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_content_fts', table_name='chat_messages')
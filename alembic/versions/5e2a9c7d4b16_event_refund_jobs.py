@@ -0,0 +1,52 @@
+"""event refund jobs
+
+Revision ID: 5e2a9c7d4b16
+Revises: 8c4d27e9b1f3
+Create Date: 2026-10-19 11:20:37.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a9c7d4b16'
+down_revision: Union[str, Sequence[str], None] = '8c4d27e9b1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'event_refund_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('event_id', sa.BigInteger(), nullable=False),
+        sa.Column('requested_by', sa.BigInteger(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('total_tickets', sa.BigInteger(), nullable=False),
+        sa.Column('refunded_tickets', sa.BigInteger(), nullable=False),
+        sa.Column('failed_tickets', sa.BigInteger(), nullable=False),
+        sa.Column('last_ticket_id', sa.BigInteger(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['requested_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_event_refund_jobs_id'), 'event_refund_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_event_refund_jobs_event_id'), 'event_refund_jobs', ['event_id'], unique=False)
+    op.create_index('ix_event_refund_jobs_status_heartbeat', 'event_refund_jobs', ['status', 'heartbeat_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_event_refund_jobs_status_heartbeat', table_name='event_refund_jobs')
+    op.drop_index(op.f('ix_event_refund_jobs_event_id'), table_name='event_refund_jobs')
+    op.drop_index(op.f('ix_event_refund_jobs_id'), table_name='event_refund_jobs')
+    op.drop_table('event_refund_jobs')
@@ -0,0 +1,30 @@
+"""chat messages flagged
+
+Revision ID: 7b3e5d1c9a42
+Revises: 1a9d6e3f7c24
+Create Date: 2026-10-19 19:12:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e5d1c9a42'
+down_revision: Union[str, Sequence[str], None] = '1a9d6e3f7c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('is_flagged', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_chat_messages_flagged', 'chat_messages', ['id'], unique=False, postgresql_where=sa.text('is_flagged'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_flagged', table_name='chat_messages')
+    op.drop_column('chat_messages', 'is_flagged')
@@ -0,0 +1,32 @@
+"""checkout session reuse
+
+Revision ID: 8c4d27e9b1f3
+Revises: 3b8e1f4c2a9d
+Create Date: 2026-10-19 10:03:51.527410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d27e9b1f3'
+down_revision: Union[str, Sequence[str], None] = '3b8e1f4c2a9d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tickets', sa.Column('stripe_checkout_url', sa.String(), nullable=True))
+    op.add_column('tickets', sa.Column('stripe_session_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_tickets_user_event_payment_status', 'tickets', ['user_id', 'event_id', 'payment_status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tickets_user_event_payment_status', table_name='tickets')
+    op.drop_column('tickets', 'stripe_session_expires_at')
+    op.drop_column('tickets', 'stripe_checkout_url')
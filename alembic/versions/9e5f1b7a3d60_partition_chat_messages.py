@@ -0,0 +1,100 @@
+"""partition chat messages
+
+Revision ID: 9e5f1b7a3d60
+Revises: 4c8a2f6d1e93
+Create Date: 2026-10-19 21:40:18.093562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.timeutils import add_months, month_start, utcnow
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e5f1b7a3d60'
+down_revision: Union[str, Sequence[str], None] = '4c8a2f6d1e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = "id, room_id, sender_id, recipient_id, content, is_read, is_flagged, created_at"
+
+# Same horizon as CHAT_PARTITION_MONTHS_AHEAD; the chat_partitions job keeps it rolling
+MONTHS_AHEAD = 3
+
+
+def chat_message_columns(id_default=None):
+    return [
+        sa.Column('id', sa.BigInteger(), server_default=id_default, nullable=False),
+        sa.Column('room_id', sa.BigInteger(), nullable=False),
+        sa.Column('sender_id', sa.BigInteger(), nullable=False),
+        sa.Column('recipient_id', sa.BigInteger(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('is_read', sa.Boolean(), nullable=False),
+        sa.Column('is_flagged', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    ]
+
+
+def create_chat_message_keys_and_indexes(primary_key) -> None:
+    op.create_primary_key('chat_messages_pkey', 'chat_messages', primary_key)
+    op.create_foreign_key('chat_messages_room_id_fkey', 'chat_messages', 'chatrooms', ['room_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('chat_messages_sender_id_fkey', 'chat_messages', 'users', ['sender_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('chat_messages_recipient_id_fkey', 'chat_messages', 'users', ['recipient_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_chat_messages_id'), 'chat_messages', ['id'], unique=False)
+    op.create_index(op.f('ix_chat_messages_sender_id'), 'chat_messages', ['sender_id'], unique=False)
+    op.create_index(op.f('ix_chat_messages_recipient_id'), 'chat_messages', ['recipient_id'], unique=False)
+    op.create_index('ix_chat_messages_sender_recipient', 'chat_messages', ['sender_id', 'recipient_id'], unique=False)
+    op.create_index('ix_chat_messages_room_id_id', 'chat_messages', ['room_id', 'id'], unique=False)
+    op.create_index('ix_chat_messages_flagged', 'chat_messages', ['id'], unique=False, postgresql_where=sa.text('is_flagged'))
+    op.create_index(
+        'ix_chat_messages_content_fts', 'chat_messages', [sa.text("to_tsvector('english', content)")], unique=False,
+        postgresql_using='gin',
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    op.rename_table('chat_messages', 'chat_messages_unpartitioned')
+
+    op.create_table(
+        'chat_messages',
+        *chat_message_columns(sa.text("nextval('chat_messages_id_seq'::regclass)")),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+
+    # One partition per UTC month, from the oldest message to a few months ahead
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM chat_messages_unpartitioned")).scalar()
+    month = month_start(oldest or utcnow())
+    last = add_months(month_start(utcnow()), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE chat_messages_p{month:%Y_%m} PARTITION OF chat_messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+        month = add_months(month, 1)
+
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {COLUMNS} FROM chat_messages_unpartitioned")
+    # The id sequence would otherwise be dropped with the old table
+    op.execute("ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id")
+    op.drop_table('chat_messages_unpartitioned')
+
+    # Built after the copy; indexes on the parent cascade to every partition
+    create_chat_message_keys_and_indexes(['id', 'created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('chat_messages', 'chat_messages_partitioned')
+    op.create_table('chat_messages', *chat_message_columns(sa.text("nextval('chat_messages_id_seq'::regclass)")))
+
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {COLUMNS} FROM chat_messages_partitioned")
+    op.execute("ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id")
+    # Drops every partition with it, archived ones included
+    op.drop_table('chat_messages_partitioned')
+
+    create_chat_message_keys_and_indexes(['id'])
@@ -0,0 +1,28 @@
+"""tickets user purchases index
+
+Revision ID: a71f3d0c6e28
+Revises: 5e2a9c7d4b16
+Create Date: 2026-10-19 12:41:09.336871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71f3d0c6e28'
+down_revision: Union[str, Sequence[str], None] = '5e2a9c7d4b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tickets_user_purchases_at', 'tickets', ['user_id', 'purchases_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tickets_user_purchases_at', table_name='tickets')
@@ -0,0 +1,28 @@
+"""tickets sweep claim
+
+Revision ID: b58d3e0a7c19
+Revises: 9e5f1b7a3d60
+Create Date: 2026-10-20 10:14:52.360418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58d3e0a7c19'
+down_revision: Union[str, Sequence[str], None] = '9e5f1b7a3d60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tickets', sa.Column('sweep_claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tickets', 'sweep_claimed_at')
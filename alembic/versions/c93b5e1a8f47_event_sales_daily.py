@@ -0,0 +1,72 @@
+"""event sales daily rollup
+
+Revision ID: c93b5e1a8f47
+Revises: a71f3d0c6e28
+Create Date: 2026-10-19 13:55:22.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c93b5e1a8f47'
+down_revision: Union[str, Sequence[str], None] = 'a71f3d0c6e28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'event_sales_daily',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('event_id', sa.BigInteger(), nullable=False),
+        sa.Column('manager_id', sa.BigInteger(), nullable=True),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('tickets_sold', sa.BigInteger(), nullable=False),
+        sa.Column('gross_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('tickets_refunded', sa.BigInteger(), nullable=False),
+        sa.Column('refunded_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['manager_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_event_sales_daily_id'), 'event_sales_daily', ['id'], unique=False)
+    op.create_index('uq_event_sales_daily_event_day', 'event_sales_daily', ['event_id', 'day'], unique=True)
+    op.create_index('ix_event_sales_daily_manager_day', 'event_sales_daily', ['manager_id', 'day'], unique=False)
+
+    # Backfill from existing tickets, same rules as rebuild_sales_rollup: sales
+    # on their purchase day, refunds on their refund day (UTC)
+    op.execute("""
+        INSERT INTO event_sales_daily (event_id, manager_id, day, tickets_sold, gross_amount, tickets_refunded, refunded_amount, updated_at)
+        SELECT t.event_id, e.manager_id, (t.purchases_at AT TIME ZONE 'UTC')::date,
+               sum(t.quantity), sum(t.total_price), 0, 0, now()
+        FROM tickets t
+        JOIN events e ON e.id = t.event_id
+        WHERE t.payment_status IN ('paid', 'refunded')
+        GROUP BY t.event_id, e.manager_id, (t.purchases_at AT TIME ZONE 'UTC')::date
+    """)
+    op.execute("""
+        INSERT INTO event_sales_daily (event_id, manager_id, day, tickets_sold, gross_amount, tickets_refunded, refunded_amount, updated_at)
+        SELECT t.event_id, e.manager_id, (t.refund_at AT TIME ZONE 'UTC')::date,
+               0, 0, sum(t.quantity), sum(t.total_price), now()
+        FROM tickets t
+        JOIN events e ON e.id = t.event_id
+        WHERE t.payment_status = 'refunded' AND t.refund_at IS NOT NULL
+        GROUP BY t.event_id, e.manager_id, (t.refund_at AT TIME ZONE 'UTC')::date
+        ON CONFLICT (event_id, day) DO UPDATE
+        SET tickets_refunded = EXCLUDED.tickets_refunded,
+            refunded_amount = EXCLUDED.refunded_amount
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_event_sales_daily_manager_day', table_name='event_sales_daily')
+    op.drop_index('uq_event_sales_daily_event_day', table_name='event_sales_daily')
+    op.drop_index(op.f('ix_event_sales_daily_id'), table_name='event_sales_daily')
+    op.drop_table('event_sales_daily')
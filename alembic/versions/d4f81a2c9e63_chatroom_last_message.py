@@ -0,0 +1,45 @@
+"""chatroom last message
+
+Revision ID: d4f81a2c9e63
+Revises: c93b5e1a8f47
+Create Date: 2026-10-19 15:02:47.118503
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f81a2c9e63'
+down_revision: Union[str, Sequence[str], None] = 'c93b5e1a8f47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chatrooms', sa.Column('last_message_id', sa.BigInteger(), nullable=True))
+    op.add_column('chatrooms', sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+    op.add_column('chatrooms', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+
+    op.execute("""
+        UPDATE chatrooms AS r
+        SET last_message_id = m.id,
+            last_message_preview = left(m.content, 200),
+            last_message_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (room_id) room_id, id, content, created_at
+            FROM chat_messages
+            ORDER BY room_id, id DESC
+        ) AS m
+        WHERE m.room_id = r.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chatrooms', 'last_message_at')
+    op.drop_column('chatrooms', 'last_message_preview')
+    op.drop_column('chatrooms', 'last_message_id')
@@ -0,0 +1,42 @@
+"""chatroom unread counters
+
+Revision ID: e6b03d9f5a71
+Revises: d4f81a2c9e63
+Create Date: 2026-10-19 15:48:12.904317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b03d9f5a71'
+down_revision: Union[str, Sequence[str], None] = 'd4f81a2c9e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chatrooms', sa.Column('user_unread_count', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('chatrooms', sa.Column('manager_unread_count', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('chatrooms', sa.Column('user_last_read_id', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('chatrooms', sa.Column('manager_last_read_id', sa.BigInteger(), server_default='0', nullable=False))
+
+    # is_read was never maintained, so existing history starts out as read
+    op.execute("""
+        UPDATE chatrooms
+        SET user_last_read_id = COALESCE(last_message_id, 0),
+            manager_last_read_id = COALESCE(last_message_id, 0)
+    """)
+    op.execute("UPDATE chat_messages SET is_read = true WHERE is_read = false")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chatrooms', 'manager_last_read_id')
+    op.drop_column('chatrooms', 'user_last_read_id')
+    op.drop_column('chatrooms', 'manager_unread_count')
+    op.drop_column('chatrooms', 'user_unread_count')
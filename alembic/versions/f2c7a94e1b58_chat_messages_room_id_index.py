@@ -0,0 +1,31 @@
+"""chat messages room id index
+
+Revision ID: f2c7a94e1b58
+Revises: e6b03d9f5a71
+Create Date: 2026-10-19 16:20:33.571942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a94e1b58'
+down_revision: Union[str, Sequence[str], None] = 'e6b03d9f5a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_messages_room_id_id', 'chat_messages', ['room_id', 'id'], unique=False)
+    # Covered by the leading column of the composite index
+    op.drop_index(op.f('ix_chat_messages_room_id'), table_name='chat_messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_chat_messages_room_id'), 'chat_messages', ['room_id'], unique=False)
+    op.drop_index('ix_chat_messages_room_id_id', table_name='chat_messages')
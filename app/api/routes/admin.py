@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timezone
 from app.database import get_db
 from app.models.auth import User
 from app.models.event import Event, EventImage
+from app.models.chat import ChatMessage
 from app.api.deps import get_current_user, require_admin, require_event_manager, require_user_or_manager
 from app.schemas.CommonResponse import ApiResponse, PaginatedResponse, PageMeta, BlockRequest
 from app.schemas.auth import UserResponse
 from app.core.media_handle.cloudinary import delete_image
 from app.schemas.event import EventCreate, EventImageOut, EventUpdate, EventOut
+from app.schemas.jobs import ChatConnectionsOut, JobStatusOut
+from app.schemas.chat import MessageOut, MessagePages
+from app.core.scheduler import scheduler
+from app.api.routes.chat import manager as chat_manager
 
 
 
@@ -536,4 +541,89 @@ def get_stats(current_user: dict = Depends(require_admin), db: Session = Depends
             "sold_events": sold_events,
             "unsold_events": unsold_events
         }
-    )
\ No newline at end of file
+    )    
+    
+    
+    
+
+
+
+@router.get('/jobs', response_model=ApiResponse[List[JobStatusOut]])
+def get_background_jobs(current_user: dict = Depends(require_admin)):
+    if current_user['role'] != 'admin':
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message='Admin access required',
+            data=None
+        )
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Background jobs retrieved successfully",
+        data=[JobStatusOut(**job) for job in scheduler.stats()]
+    )
+
+
+
+
+@router.get('/chat/connections', response_model=ApiResponse[ChatConnectionsOut])
+def get_chat_connections(current_user: dict = Depends(require_admin)):
+    if current_user['role'] != 'admin':
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message='Admin access required',
+            data=None
+        )
+
+    # Gauges for this worker process only
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Chat connections retrieved successfully",
+        data=ChatConnectionsOut(**chat_manager.stats())
+    )
+
+
+
+
+@router.get('/chat/flagged', response_model=ApiResponse[MessagePages])
+def get_flagged_chat_messages(
+    before_id: Optional[int] = Query(None, description="Load flagged messages with id < before_id"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    if current_user['role'] != 'admin':
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message='Admin access required',
+            data=None
+        )
+
+    # Newest first over the partial ix_chat_messages_flagged index
+    q = (
+        db.query(ChatMessage.id, ChatMessage.room_id, ChatMessage.sender_id, User.username.label("sender_name"), ChatMessage.content, ChatMessage.created_at)
+        .outerjoin(User, User.id == ChatMessage.sender_id)
+        .filter(ChatMessage.is_flagged.is_(True))
+    )
+    if before_id is not None:
+        q = q.filter(ChatMessage.id < before_id)
+    rows = q.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = [MessageOut(**row._mapping) for row in rows[:limit]]
+
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Flagged chat messages retrieved successfully",
+        data=MessagePages(
+            items=items,
+            next_before_id=items[-1].id if has_more else None,
+            has_more=has_more
+        )
+    )
@@ -1,15 +1,33 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, Query, status
 from jose import JWTError, jwt
+from sqlalchemy import and_, case, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
 import json
+from anyio import from_thread
 from app.models.ticket import Ticket
+from app.models.event import Event
+from app.models.auth import User
 from app.core.config import settings
-from app.database import SessionLocal, get_db
+from app.database import AsyncSessionLocal, get_db
 from app.api.deps import get_current_user  
 from app.models.chat import Chatroom, ChatMessage
-from app.schemas.chat import ChatRoomOut, MessageOut, MessagePages
+from app.schemas.chat import ChatRoomOut, ChatRoomPages, MarkReadRequest, MessageOut, MessagePages, MessageSearchPages, ReadReceiptOut
 from app.schemas.CommonResponse import ApiResponse
+from app.core.chat.backplane import create_backplane
+from app.core.chat.connections import ClientConnection, ConnectionManager
+from app.core.chat.writer import message_writer
+from app.core.chat.reads import mark_read
+from app.core.chat.recent import RecentMessages, RoomBuffer
+from app.core.chat.auth_cache import chat_auth_cache
+from app.core.chat.codec import choose_subprotocol, unpack_frame
+from app.core.chat.moderation import chat_moderator
+from app.core.chat.search import search_messages
+from app.core.chat.partitions import created_since
+from app.core.timeutils import utcnow
 
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
@@ -37,76 +55,152 @@ async def ws_error(
 
 
 
-def has_active_ticket(db: Session, user_id: int, event_id: int) -> bool:
+async def has_active_ticket(db: AsyncSession, user_id: int, event_id: int) -> bool:
 
-    ticket = (
-        db.query(Ticket)
-        .filter(
-            Ticket.user_id == user_id,
-            Ticket.event_id == event_id,
-            Ticket.refund_at.is_(None),
-            Ticket.refund_id.is_(None),
-            Ticket.payment_status=="paid" 
+    # EXISTS over ix_tickets_active_user_event: an index-only probe
+    return await db.scalar(
+        select(
+            select(Ticket.id)
+            .where(
+                Ticket.user_id == user_id,
+                Ticket.event_id == event_id,
+                Ticket.refund_at.is_(None),
+                Ticket.refund_id.is_(None),
+                Ticket.payment_status=="paid" 
+            )
+            .exists()
         )
-        .first()
     )
-    return ticket is not None
 
 
 
 
+def ack_when_saved(connection: ClientConnection, saved: asyncio.Future, room_id: int) -> None:
 
+    def done(future: asyncio.Future) -> None:
+        if future.exception() is None:
+            connection.send(json.dumps({
+                "success": True,
+                "statusCode": status.HTTP_201_CREATED,
+                "message": "Message saved",
+                "data": {"id": future.result()}
+            }), room_id)
+        else:
+            connection.send(json.dumps({
+                "success": False,
+                "statusCode": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "message": "Message could not be saved",
+                "data": None
+            }), room_id)
 
+    saved.add_done_callback(done)
 
-class ConnectionManager:
 
-    def __init__(self):
-        self.active: Dict[int, List[Tuple[int, WebSocket]]] = {}
 
-    async def connect(self, room_id: int, user_id: int, websocket: WebSocket) -> None:
 
-        self.active.setdefault(room_id, []).append((user_id, websocket))
+recent_messages = RecentMessages()
 
-    def disconnect(self, room_id: int, user_id: int, websocket: WebSocket) -> None:
+manager = ConnectionManager(create_backplane(), recent_messages)
 
-        if room_id not in self.active:
-            return
+# chat_messages ids are bigint
+LARGEST_MESSAGE_ID = 2 ** 63 - 1
 
-        self.active[room_id] = [
-            (uid, ws) for (uid, ws) in self.active[room_id]
-            if not (uid == user_id and ws == websocket)
-        ]
 
-        if not self.active[room_id]:
-            del self.active[room_id]
 
-    async def broadcast(self, room_id: int, message: dict) -> None:
 
-        dead: List[Tuple[int, WebSocket]] = []
+def history_query(room_id: int, room_created_at: datetime):
+    # One range scan on ix_chat_messages_room_id_id, sender names joined in;
+    # partitions older than the room are pruned
+    return (
+        select(
+            ChatMessage.id,
+            ChatMessage.room_id,
+            ChatMessage.sender_id,
+            User.username.label("sender_name"),
+            ChatMessage.content,
+            ChatMessage.created_at,
+        )
+        .outerjoin(User, User.id == ChatMessage.sender_id)
+        .where(ChatMessage.room_id == room_id, created_since(room_created_at))
+    )
 
-        for uid, ws in self.active.get(room_id, []):
-            try:
-                await ws.send_text(json.dumps(message))
-            except Exception:
-                dead.append((uid, ws))
 
-        for uid, ws in dead:
-            self.disconnect(room_id, uid, ws)
 
 
-manager = ConnectionManager()
+async def replay_missed(connection: ClientConnection, room_id: int, last_seen_id: int) -> None:
+    # Runs after the socket is subscribed but before its writer starts, so
+    # anything broadcast meanwhile waits in the queue behind the replay.
+    cached = recent_messages.page_after(room_id, last_seen_id, settings.CHAT_REPLAY_MAX)
+    if cached is not None:
+        missed, has_more = cached
+    else:
+        # A message broadcast before the subscribe may still be waiting in a
+        # write-behind batch, on this worker or another; the read below has to see it
+        if not await message_writer.settle_room(room_id):
+            print(f"Chat replay for room {room_id} went ahead with writes still pending")
+        async with AsyncSessionLocal() as db:
+            room_created_at = await db.scalar(select(Chatroom.created_at).where(Chatroom.id == room_id))
+            rows = (await db.execute(
+                history_query(room_id, room_created_at)
+                .where(ChatMessage.id > last_seen_id)
+                .order_by(ChatMessage.id.asc())
+                .limit(settings.CHAT_REPLAY_MAX + 1)
+            )).all() if room_created_at is not None else []
+        missed = [MessageOut(**row._mapping) for row in rows[:settings.CHAT_REPLAY_MAX]]
+        has_more = len(rows) > settings.CHAT_REPLAY_MAX
+
+    for message in missed:
+        await connection.send_now(json.dumps(new_message_frame(message.model_dump(mode="json"))), room_id)
+
+    # has_more means the gap is larger than a replay; the client should page
+    # the rest over HTTP with after_id
+    await connection.send_now(json.dumps({
+        "success": True,
+        "statusCode": status.HTTP_200_OK,
+        "message": "Replay complete",
+        "data": {
+            "replayed": len(missed),
+            "last_id": missed[-1].id if missed else last_seen_id,
+            "has_more": has_more
+        }
+    }), room_id)
+    connection.discard_queued({message.id for message in missed})
+
+
+
+
+def message_page(items: List[MessageOut], has_more: bool, forward: bool) -> ApiResponse:
 
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Messages retrieved successfully",
+        data=MessagePages(
+            items=items,
+            next_before_id=items[0].id if has_more and items and not forward else None,
+            next_after_id=items[-1].id if has_more and items and forward else None,
+            has_more=has_more
+        )
+    )
+
+
+
+
+async def broadcast_read_receipt(receipt: dict) -> None:
+    await manager.broadcast(receipt["room_id"], {
+        "success": True,
+        "statusCode": status.HTTP_200_OK,
+        "message": "Messages read",
+        "data": receipt
+    })
 
 
 
-        
 
 
-@router.websocket("/ws/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Query(None)):
 
-    await websocket.accept()
 
+async def authenticate_ws(websocket: WebSocket, token: Optional[str]) -> Optional[int]:
 
     if not token:
         await ws_error(
@@ -114,49 +208,236 @@ async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Qu
             http_status=status.HTTP_401_UNAUTHORIZED,
             message="Token required"
         )
-        return
+        return None
 
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            await ws_error(
-                websocket,
-                http_status=status.HTTP_401_UNAUTHORIZED,
-                message="Token missing user_id"
-            )
-            return
     except JWTError:
         await ws_error(
             websocket,
             http_status=status.HTTP_401_UNAUTHORIZED,
             message="Invalid token"
         )
-        return
+        return None
+
+    user_id = payload.get("user_id")
+    if not user_id:
+        await ws_error(
+            websocket,
+            http_status=status.HTTP_401_UNAUTHORIZED,
+            message="Token missing user_id"
+        )
+        return None
+    return user_id
+
+
+
+
+async def chat_rooms_for(db: AsyncSession, user_id: int, room_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    # room_id -> recipient id for every room the user may chat in, in one query:
+    # managers always, customers only while they hold an active ticket
+    active_ticket = (
+        select(Ticket.id)
+        .where(
+            Ticket.user_id == Chatroom.user_id,
+            Ticket.event_id == Chatroom.event_id,
+            Ticket.refund_at.is_(None),
+            Ticket.refund_id.is_(None),
+            Ticket.payment_status == "paid"
+        )
+        .exists()
+    )
+    q = select(Chatroom.id, Chatroom.user_id, Chatroom.manager_id).where(
+        or_(Chatroom.manager_id == user_id, and_(Chatroom.user_id == user_id, active_ticket))
+    )
+    if room_ids is not None:
+        q = q.where(Chatroom.id.in_(room_ids))
+
+    rows = (await db.execute(q)).all()
+    return {row.id: row.manager_id if user_id == row.user_id else row.user_id for row in rows}
+
+
+
 
+async def receive_frame(websocket: WebSocket) -> dict:
+    # Text frames are JSON (or bare message text); binary frames are MessagePack
+    # with the short keys of the negotiated chat.msgpack protocol
+    received = await websocket.receive()
+    if received["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(received.get("code", 1000))
 
-    db: Session = SessionLocal()
+    raw = received.get("text")
     try:
-        chatroom = db.query(Chatroom).filter(Chatroom.id == room_id).first()
+        obj = unpack_frame(received["bytes"]) if raw is None else json.loads(raw)
+        if not isinstance(obj, dict):
+            raise ValueError
+    except Exception:
+        obj = {"content": raw}
+    return obj
+
+
+
+
+def new_message_frame(message: dict) -> dict:
+    return {
+        "success": True,
+        "statusCode": status.HTTP_200_OK,
+        "message": "New message",
+        "data": message
+    }
+
+
+
+
+def error_frame(http_status: int, message: str) -> str:
+    return json.dumps({
+        "success": False,
+        "statusCode": http_status,
+        "message": message,
+        "data": None
+    })
+
+
+
+
+async def serve_chat(connection: ClientConnection, sender_name: Optional[str], rooms: Dict[int, int], fixed_room: Optional[int] = None) -> None:
+    # Receive loop shared by the per-room socket and the multiplexed /chat/ws,
+    # where every client frame names its room_id.
+    websocket = connection.websocket
+    user_id = connection.user_id
+
+    while True:
+        obj = await receive_frame(websocket)
+        connection.touch()
+
+        frame_type = obj.get("type")
+
+        if frame_type == "pong":
+            connection.answers_pings = True
+            continue
+        if frame_type == "ping":
+            connection.send(json.dumps({"success": True, "statusCode": status.HTTP_200_OK, "message": "pong", "data": None}))
+            continue
+
+        try:
+            room_id = fixed_room if fixed_room is not None else int(obj.get("room_id"))
+        except (TypeError, ValueError):
+            connection.send(error_frame(status.HTTP_400_BAD_REQUEST, "room_id required"))
+            continue
+
+        # Everything past here can cost a query, a write or a broadcast
+        if not manager.allow(connection):
+            if settings.CHAT_RATE_LIMIT_POLICY == "disconnect":
+                await connection.close(code=1008)
+                return
+            connection.send(error_frame(status.HTTP_429_TOO_MANY_REQUESTS, "Sending too fast, message dropped"), room_id)
+            continue
+
+        if frame_type == "subscribe" and fixed_room is None:
+            if room_id not in rooms:
+                granted = chat_auth_cache.get(user_id, room_id)
+                if granted is not None:
+                    rooms[room_id] = granted[0]
+                else:
+                    async with AsyncSessionLocal() as db:
+                        found = await chat_rooms_for(db, user_id, [room_id])
+                    rooms.update(found)
+                    for room, recipient_id in found.items():
+                        chat_auth_cache.put(user_id, room, recipient_id, sender_name)
+            if room_id not in rooms:
+                connection.send(error_frame(status.HTTP_403_FORBIDDEN, "Not allowed to join this chat room"), room_id)
+                continue
+            if not await manager.subscribe(connection, room_id):
+                connection.send(error_frame(status.HTTP_429_TOO_MANY_REQUESTS, "Chat room has too many connections"), room_id)
+                continue
+            connection.send(json.dumps({"success": True, "statusCode": status.HTTP_200_OK, "message": "Subscribed", "data": None}), room_id)
+            continue
+
+        if frame_type == "unsubscribe" and fixed_room is None:
+            await manager.unsubscribe(connection, room_id)
+            rooms.pop(room_id, None)
+            continue
+
+        if room_id not in connection.rooms:
+            connection.send(error_frame(status.HTTP_403_FORBIDDEN, "Not subscribed to this chat room"), room_id)
+            continue
+
+        if frame_type == "read":
+            try:
+                up_to_id = int(obj.get("up_to_id"))
+            except (TypeError, ValueError):
+                up_to_id = 0
+            if up_to_id > 0:
+                receipt, changed = await mark_read(room_id, user_id, up_to_id)
+                if changed:
+                    await broadcast_read_receipt(receipt)
+            continue
+
+        content = str(obj.get("content") or "").strip()
+
+        if not content:
+            continue
+
+        if len(content) > settings.CHAT_MAX_MESSAGE_CHARS:
+            connection.send(error_frame(status.HTTP_400_BAD_REQUEST, f"Message too long (max {settings.CHAT_MAX_MESSAGE_CHARS} characters)"), room_id)
+            continue
+
+        content, flagged = chat_moderator.check(content)
+        if content is None:
+            connection.send(error_frame(status.HTTP_400_BAD_REQUEST, "Message contains blocked terms"), room_id)
+            continue
+
+        # Sized with the widest id and timestamp before anything is saved, so a
+        # message the backplane would refuse is rejected instead of stored undelivered
+        draft = new_message_frame({
+            "id": LARGEST_MESSAGE_ID,
+            "room_id": room_id,
+            "sender_id": user_id,
+            "recipient_id": rooms[room_id],
+            "content": content,
+            "sender_name": sender_name,
+            "created_at": utcnow().isoformat(timespec="microseconds"),
+        })
+        if not manager.fits(draft):
+            connection.send(error_frame(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Message too large"), room_id)
+            continue
+
+        message, saved = await message_writer.submit(room_id, user_id, sender_name, rooms[room_id], content, flagged)
+
+        await manager.broadcast(room_id, new_message_frame(message))
+        ack_when_saved(connection, saved, room_id)
+
+
+
+
+async def authorize_room(websocket: WebSocket, user_id: int, room_id: int) -> Optional[Tuple[int, Optional[str]]]:
+    # (recipient_id, sender_name) when the user may chat in the room; reconnects
+    # within the cache TTL are answered from memory
+    granted = chat_auth_cache.get(user_id, room_id)
+    if granted is not None:
+        return granted
+
+    async with AsyncSessionLocal() as db:
+        chatroom = await db.get(Chatroom, room_id)
         if not chatroom:
             await ws_error(
                 websocket,
                 http_status=status.HTTP_404_NOT_FOUND,
                 message="Chat room not found"
             )
-            return
+            return None
         
         if user_id == chatroom.manager_id:
             pass
         
         elif user_id == chatroom.user_id:
-            if not has_active_ticket(db, user_id, chatroom.event_id):
+            if not await has_active_ticket(db, user_id, chatroom.event_id):
                 await ws_error(
                     websocket,
                     http_status=status.HTTP_403_FORBIDDEN,
                     message="No active ticket for this event"
                 )
-                return
+                return None
             
         else:
             await ws_error(
@@ -164,50 +445,52 @@ async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Qu
                 http_status=status.HTTP_403_FORBIDDEN,
                 message="Your are not a participant in this chat room"
             )
-            return
-        
-        
-        await manager.connect(room_id, user_id, websocket)
+            return None
 
+        sender_name = await db.scalar(select(User.username).where(User.id == user_id))
 
-        while True:
-            raw = await websocket.receive_text()
+    recipient_id = chatroom.manager_id if user_id == chatroom.user_id else chatroom.user_id
+    chat_auth_cache.put(user_id, room_id, recipient_id, sender_name)
+    return recipient_id, sender_name
 
-            try:
-                obj = json.loads(raw)
-                content = (obj.get("content") or "").strip()
-            except Exception:
-                content = raw.strip()
 
-            if not content:
-                continue
 
-            recipient_id = chatroom.manager_id if user_id == chatroom.user_id else chatroom.user_id
 
-            new_message = ChatMessage(
-                room_id=room_id,
-                sender_id=user_id,
-                recipient_id=recipient_id,
-                content=content,
-                is_read=False
-            )
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
+@router.websocket("/ws/{room_id}")
+async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Query(None), last_seen_id: Optional[int] = Query(None)):
 
-            await manager.broadcast(room_id, {
-                "success": True,
-                "statusCode": status.HTTP_200_OK,
-                "message": "New message",
-                "data": {
-                    "id": new_message.id,
-                    "room_id": new_message.room_id,
-                    "sender_id": new_message.sender_id,
-                    "recipient_id": new_message.recipient_id,
-                    "content": new_message.content,
-                    "created_at": new_message.created_at.isoformat()
-                }
-            })
+    subprotocol = choose_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+
+    user_id = await authenticate_ws(websocket, token)
+    if user_id is None:
+        return
+
+
+    granted = await authorize_room(websocket, user_id, room_id)
+    if granted is None:
+        return
+
+    recipient_id, sender_name = granted
+    rooms = {room_id: recipient_id}
+
+    if manager.user_at_limit(user_id) or manager.room_at_limit(room_id):
+        await ws_error(
+            websocket,
+            http_status=status.HTTP_429_TOO_MANY_REQUESTS,
+            message="Too many chat connections",
+            close_code=1013
+        )
+        return
+
+    connection = None
+    try:
+        connection = await manager.connect([room_id], user_id, websocket, start=last_seen_id is None, subprotocol=subprotocol)
+        if last_seen_id is not None:
+            await replay_missed(connection, room_id, last_seen_id)
+            connection.start()
+
+        await serve_chat(connection, sender_name, rooms, fixed_room=room_id)
 
     except WebSocketDisconnect:
         pass
@@ -222,66 +505,204 @@ async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Qu
         except Exception:
             pass
     finally:
-        manager.disconnect(room_id, user_id, websocket)
-        db.close()
+        if connection is not None:
+            await manager.disconnect(connection)
 
 
 
 
+@router.websocket("/ws")
+async def user_websocket_endpoint(websocket: WebSocket, token: str = Query(None), rooms: Optional[str] = Query(None, description="Comma-separated room ids; all of the user's rooms when omitted")):
 
-@router.get("/rooms", response_model=ApiResponse[List[ChatRoomOut]])
-async def get_chat_rooms(
+    subprotocol = choose_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+
+    user_id = await authenticate_ws(websocket, token)
+    if user_id is None:
+        return
+
+    try:
+        room_ids = [int(room) for room in rooms.split(",") if room.strip()] if rooms else None
+    except ValueError:
+        await ws_error(
+            websocket,
+            http_status=status.HTTP_400_BAD_REQUEST,
+            message="rooms must be a comma-separated list of room ids"
+        )
+        return
+
+    if manager.user_at_limit(user_id):
+        await ws_error(
+            websocket,
+            http_status=status.HTTP_429_TOO_MANY_REQUESTS,
+            message="Too many chat connections",
+            close_code=1013
+        )
+        return
+
+    cached = [chat_auth_cache.get(user_id, room) for room in room_ids] if room_ids else []
+    if room_ids and all(grant is not None for grant in cached):
+        allowed = {room: grant[0] for room, grant in zip(room_ids, cached)}
+        sender_name = cached[0][1]
+    else:
+        async with AsyncSessionLocal() as db:
+            allowed = await chat_rooms_for(db, user_id, room_ids)
+            sender_name = await db.scalar(select(User.username).where(User.id == user_id))
+        for room, recipient_id in allowed.items():
+            chat_auth_cache.put(user_id, room, recipient_id, sender_name)
+
+    connection = None
+    try:
+        connection = await manager.connect(allowed, user_id, websocket, subprotocol=subprotocol)
+        connection.send(json.dumps({
+            "success": True,
+            "statusCode": status.HTTP_200_OK,
+            "message": "Subscribed",
+            # Rooms already at their connection limit are left out
+            "data": {"room_ids": sorted(connection.rooms)}
+        }))
+
+        await serve_chat(connection, sender_name, allowed)
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await ws_error(
+                websocket,
+                http_status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                message=f"Server error: {str(e)}",
+                close_code=1011
+            )
+        except Exception:
+            pass
+    finally:
+        if connection is not None:
+            await manager.disconnect(connection)
+
+
+
+
+@router.get("/rooms", response_model=ApiResponse[ChatRoomPages])
+def get_chat_rooms(
+    before_activity_at: Optional[datetime] = Query(None, description="Keyset cursor: next_before_activity_at of the previous page"),
+    before_id: Optional[int] = Query(None, description="Keyset cursor: next_before_id of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     user_id = current_user["id"]
 
-    chatrooms = db.query(Chatroom).filter(
-        (Chatroom.user_id == user_id) | (Chatroom.manager_id == user_id)
-    ).all()
-
-    rooms_out: List[ChatRoomOut] = []
-    for room in chatrooms:
-        other_user = room.manager if room.user_id == user_id else room.user
+    if (before_activity_at is None) != (before_id is None):
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            message="before_activity_at and before_id must be given together",
+            data=None
+        )
 
-        last_message = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.room_id == room.id)
-            .order_by(ChatMessage.created_at.desc())
-            .first()
+    # Rooms without messages sort by when they were opened
+    activity_at = func.coalesce(Chatroom.last_message_at, Chatroom.created_at)
+    other_user_id = case((Chatroom.user_id == user_id, Chatroom.manager_id), else_=Chatroom.user_id)
+
+    q = (
+        db.query(
+            Chatroom.id,
+            Chatroom.event_id,
+            Event.title,
+            User.id.label("other_user_id"),
+            User.username,
+            Chatroom.last_message_id,
+            Chatroom.last_message_preview,
+            Chatroom.last_message_at,
+            activity_at.label("activity_at"),
+            case((Chatroom.user_id == user_id, Chatroom.user_unread_count), else_=Chatroom.manager_unread_count).label("unread_count"),
         )
+        .join(Event, Event.id == Chatroom.event_id)
+        .join(User, User.id == other_user_id)
+        .filter((Chatroom.user_id == user_id) | (Chatroom.manager_id == user_id))
+    )
 
-        rooms_out.append(ChatRoomOut(
-            room_id=room.id,
-            event_id=room.event_id,
-            event_title=room.event.title,
-            other_user_id=other_user.id,
-            other_username=other_user.username,
-            last_message=last_message.content if last_message else None,
-            last_message_time=last_message.created_at if last_message else None
-        ))
+    if before_activity_at is not None:
+        q = q.filter(tuple_(activity_at, Chatroom.id) < tuple_(before_activity_at, before_id))
+
+    rows = q.order_by(activity_at.desc(), Chatroom.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    rooms_out = [
+        ChatRoomOut(
+            room_id=row.id,
+            event_id=row.event_id,
+            event_title=row.title,
+            other_user_id=row.other_user_id,
+            other_username=row.username,
+            last_message_id=row.last_message_id,
+            last_message=row.last_message_preview,
+            last_message_time=row.last_message_at,
+            last_activity_at=row.activity_at,
+            unread_count=row.unread_count
+        )
+        for row in rows
+    ]
 
     return ApiResponse(
         success=True,
         statusCode=status.HTTP_200_OK,
         message="Chat rooms retrieved successfully",
-        data=rooms_out
+        data=ChatRoomPages(
+            items=rooms_out,
+            next_before_activity_at=rows[-1].activity_at if has_more else None,
+            next_before_id=rows[-1].id if has_more else None,
+            has_more=has_more
+        )
     )
 
 
 
+def cached_page(room_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> Optional[Tuple[List[MessageOut], bool]]:
+    # The buffer is fed by the backplane on the event loop; sync routes reach it
+    # through from_thread so it is never touched from two threads
+    if room_id not in manager.active:
+        return None
+    if after_id is not None:
+        return recent_messages.page_after(room_id, after_id, limit)
+    return recent_messages.page(room_id, before_id, limit)
+
+
+def open_recent(room_id: int) -> Optional[RoomBuffer]:
+    if room_id not in manager.active:
+        return None
+    return recent_messages.open(room_id)
+
+
+def seed_recent(room_id: int, room: RoomBuffer, fetched: List[MessageOut]) -> None:
+    recent_messages.seed(room_id, room, fetched)
+
+
+
+
 @router.get("/rooms/{room_id}/messages", response_model=ApiResponse[MessagePages])
-async def get_chat_messages(
+def get_chat_messages(
     room_id: int,
     before_id: Optional[int] = Query(None, description="Load messages with id < before_id"),
+    after_id: Optional[int] = Query(None, description="Load messages with id > after_id, oldest first, to catch up"),
     limit: int = Query(10, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     user_id = current_user["id"]
 
-    chatroom = db.query(Chatroom).filter(Chatroom.id == room_id).first()
-    print(f"Chatroom: {chatroom}")
+    if before_id is not None and after_id is not None:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_400_BAD_REQUEST,
+            message="Use either before_id or after_id, not both",
+            data=None
+        )
+
+    chatroom = db.query(Chatroom.user_id, Chatroom.manager_id, Chatroom.created_at).filter(Chatroom.id == room_id).first()
     if not chatroom or (chatroom.user_id != user_id and chatroom.manager_id != user_id):
         return ApiResponse(
             success=False,
@@ -290,46 +711,91 @@ async def get_chat_messages(
             data=None
         )
 
-    q = db.query(ChatMessage).filter(ChatMessage.room_id == room_id)
+    cached = from_thread.run_sync(cached_page, room_id, before_id, after_id, limit)
+    if cached is not None:
+        items, has_more = cached
+        return message_page(items, has_more, after_id is not None)
+
+    # A first page seeds the hot-room buffer. It is opened first so it collects
+    # deliveries, then the room's pending writes are settled so the read
+    # below covers everything broadcast before that
+    recent_room = None
+    if before_id is None and after_id is None:
+        recent_room = from_thread.run_sync(open_recent, room_id)
+        if recent_room is not None and not from_thread.run(message_writer.settle_room, room_id):
+            recent_room = None
+
+    q = history_query(room_id, chatroom.created_at)
+    if after_id is not None:
+        q = q.where(ChatMessage.id > after_id).order_by(ChatMessage.id.asc())
+    else:
+        if before_id is not None:
+            q = q.where(ChatMessage.id < before_id)
+        q = q.order_by(ChatMessage.id.desc())
+
+    rows = db.execute(q.limit(limit + 1)).all()
+    fetched = [MessageOut(**row._mapping) for row in rows]
+
+    # Including the look-ahead row, so the next first-page request can be
+    # answered without touching the table
+    if recent_room is not None:
+        from_thread.run_sync(seed_recent, room_id, recent_room, fetched)
 
-    if before_id is not None:
-        q = q.filter(ChatMessage.id < before_id)
+    has_more = len(rows) > limit
+    items = fetched[:limit]
+    if after_id is None:
+        items.reverse()
 
-    rows = (
-        q.order_by(ChatMessage.id.desc())
-         .limit(limit + 1)  
-         .all()
-    )
+    return message_page(items, has_more, after_id is not None)
 
-    has_more = len(rows) > limit
-    rows = rows[:limit]
 
-    rows.reverse()
-
-    items = []
-    for m in rows:
-        item = MessageOut(
-            id = m.id,
-            room_id=m.room_id,
-            sender_id=m.sender_id,
-            sender_name=m.sender.username if m.sender else None,
-            content=m.content,
-            created_at=m.created_at,
-        )
-        items.append(item)
-    
-    print(f"Items: {items}")
-    next_before_id = rows[0].id if has_more and rows else None
+
+
+@router.get("/search", response_model=ApiResponse[MessageSearchPages])
+def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for in the caller's chat rooms"),
+    before_id: Optional[int] = Query(None, description="Keyset cursor: next_before_id of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    items, has_more = search_messages(db, current_user["id"], q, before_id, limit)
 
     return ApiResponse(
         success=True,
         statusCode=status.HTTP_200_OK,
-        message="Messages retrieved successfully",
-        data=MessagePages(
+        message="Messages found" if items else "No messages found",
+        data=MessageSearchPages(
             items=items,
-            next_before_id=next_before_id,
+            next_before_id=items[-1].id if has_more else None,
             has_more=has_more
         )
     )
-    
-    
+
+
+
+
+@router.post("/rooms/{room_id}/read", response_model=ApiResponse[ReadReceiptOut])
+async def mark_room_read(
+    room_id: int,
+    body: MarkReadRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    receipt, changed = await mark_read(room_id, current_user["id"], body.up_to_id)
+    if receipt is None:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message="Not allowed to read messages in this room",
+            data=None
+        )
+
+    if changed:
+        await broadcast_read_receipt(receipt)
+
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Messages marked as read",
+        data=ReadReceiptOut(**receipt)
+    )
@@ -1,24 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from anyio import from_thread
+from typing import List, Optional
 from sqlalchemy.orm import Session, aliased
 from sqlmodel import func
+from sqlalchemy import tuple_
 import stripe
-from datetime import datetime, timedelta, timezone
+import json
+from datetime import date, datetime, timedelta, timezone
 from app.api.deps import get_current_user, require_user_or_manager, require_admin, require_event_manager
 from app.database import get_db
 from app.models.ticket import Ticket
 from app.models.event import Event
 from app.models.auth import User
 from app.models.chat import Chatroom, ChatMessage
+from app.models.refund import EventRefundJob
+from app.models.sales import EventSalesDaily
 from app.schemas.CommonResponse import ApiResponse, PaginatedResponse, PageMeta, PaginatedListResponse
+from app.schemas.analytics import EventSalesOut, EventSalesSeriesOut, SalesDayOut
 from app.schemas.payment_chat import PurchasedEventChatItem, CustomerChatItem, ManagerEventCustomer
-from app.schemas.ticket import TicketPurchaseRequest, TicketResponse, CheckoutSessionResponse
+from app.schemas.ticket import TicketPurchaseRequest, TicketResponse, CheckoutSessionResponse, RefundJobOut, TicketPages
 from app.core.config import settings
+from app.core.stripe_client import create_checkout_session_async, create_refund_async
+from app.core.chat.auth_cache import chat_auth_cache
+from app.core.webhook_inbox import enqueue_webhook_event, webhook_consumer
+from app.core.scheduler import scheduler
+from app.core.sales_rollup import bump_sales_rollup, rebuild_sales_rollup
 
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
 router = APIRouter( prefix="/payments", tags=["Payment"] )
 
 
@@ -38,6 +48,15 @@ async def create_checkout_session(
             message="Event not found",
             data=None
         )
+
+    # Also covers reusing an open session of an event cancelled since
+    if not event.is_active:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_400_BAD_REQUEST,
+            message="Event has been cancelled",
+            data=None
+        )
     
     
     available_tickets = event.ticket_limit - event.tickets_sold
@@ -50,34 +69,68 @@ async def create_checkout_session(
             data=None
         )
 
+    now = datetime.now(timezone.utc)
+    pending_ticket = (
+        db.query(Ticket)
+        .filter(
+            Ticket.user_id == current_user['id'],
+            Ticket.event_id == purchase_request.event_id,
+            Ticket.payment_status == "pending",
+            Ticket.quantity == purchase_request.quantity,
+            Ticket.stripe_checkout_url.isnot(None),
+            Ticket.stripe_session_expires_at > now + timedelta(minutes=settings.CHECKOUT_REUSE_MIN_REMAINING_MINUTES)
+        )
+        .order_by(Ticket.stripe_session_expires_at.desc())
+        .first()
+    )
+    if pending_ticket:
+        return ApiResponse(
+            success=True,
+            statusCode=status.HTTP_200_OK,
+            message="Existing checkout session reused",
+            data=CheckoutSessionResponse(
+                session_id=pending_ticket.stripe_session_id,
+                checkout_url=pending_ticket.stripe_checkout_url
+            )
+        )
+
     total_price = float(event.ticket_price) * purchase_request.quantity
+    expires_at = now + timedelta(minutes=settings.STRIPE_SESSION_LIFETIME_MINUTES)
     
-    session = stripe.checkout.Session.create(
-        payment_method_types=['card'],
-        line_items=[
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": f"Tickets for {event.title}",
-                        "description": f"Purchase of {purchase_request.quantity} tickets for event '{event.title}'"
+    try:
+        session = await create_checkout_session_async({
+            "payment_method_types": ['card'],
+            "line_items": [
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "product_data": {
+                            "name": f"Tickets for {event.title}",
+                            "description": f"Purchase of {purchase_request.quantity} tickets for event '{event.title}'"
+                        },
+                        "unit_amount": int(float(event.ticket_price) * 100)
                     },
-                    "unit_amount": int(float(event.ticket_price) * 100)
-                },
+                    "quantity": purchase_request.quantity,
+                }
+            ],
+            "mode": "payment",
+            "success_url": f"{settings.FRONTEND_URL}/payment-success?session_id={{CHECKOUT_SESSION_ID}}",
+            "cancel_url": f"{settings.FRONTEND_URL}/payment-cancel",
+            "metadata": {
+                "user_id": current_user['id'],
+                "event_id": purchase_request.event_id,
                 "quantity": purchase_request.quantity,
-            }
-        ],
-        mode="payment",
-        success_url=f"{settings.FRONTEND_URL}/payment-success?session_id={{CHECKOUT_SESSION_ID}}",
-        cancel_url=f"{settings.FRONTEND_URL}/payment-cancel",
-        metadata={
-            "user_id": current_user['id'],
-            "event_id": purchase_request.event_id,
-            "quantity": purchase_request.quantity,
-            "total_price": total_price
-        },
-        expires_at=int((datetime.now(timezone.utc) + timedelta(hours=1)).timestamp())  # Session expires in 1 hour
-    )
+                "total_price": total_price
+            },
+            "expires_at": int(expires_at.timestamp())
+        })
+    except stripe.error.StripeError as e:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            message=f"Stripe error: {str(e)}",
+            data=None
+        )
     
     ticket = Ticket(
         event_id=purchase_request.event_id,
@@ -86,6 +139,8 @@ async def create_checkout_session(
         total_price=total_price,
         purchases_at=datetime.now(timezone.utc),
         stripe_session_id=session.id,
+        stripe_checkout_url=session.url,
+        stripe_session_expires_at=expires_at,
         payment_status="pending"
     )
     db.add(ticket)
@@ -123,37 +178,17 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             data=None
         )
         
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        session_id = session.get('id')
-        payment_intent_id = session.get('payment_intent')
-        ticket = db.query(Ticket).filter(Ticket.stripe_session_id == session_id).first()
-        if ticket:
-            ticket.payment_status = "paid"
-            ticket.stripe_payment_intent_id = payment_intent_id
-            ticket.purchases_at = datetime.now(timezone.utc)
-            event = db.query(Event).filter(Event.id == ticket.event_id).first()
-            if event:
-                event.tickets_sold += ticket.quantity
-            room = db.query(Chatroom).filter(Chatroom.event_id == ticket.event_id, Chatroom.user_id == ticket.user_id).first()
-            if not room:
-                room = Chatroom(
-                    event_id=ticket.event_id,
-                    manager_id=event.manager_id,
-                    user_id=ticket.user_id
-                )
-                db.add(room)
-            db.commit()
-            db.refresh(ticket)
-            db.refresh(room)
-            
-    elif event['type'] == 'checkout.session.expired':
-        session = event['data']['object']
-        session_id = session.get('id')
-        ticket = db.query(Ticket).filter(Ticket.stripe_session_id == session_id).first()
-        if ticket and ticket.payment_status == "pending":
-            ticket.payment_status = "cancelled"
-            db.commit()
+    # Sync INSERT and commit, kept off the event loop
+    inserted = await run_in_threadpool(enqueue_webhook_event, db, event['id'], event['type'], json.loads(payload))
+    if not inserted:
+        return ApiResponse(
+            success=True,
+            statusCode=status.HTTP_200_OK,
+            message="Webhook already received",
+            data=None
+        )
+
+    webhook_consumer.notify()
             
     return ApiResponse(
         success=True,
@@ -242,10 +277,10 @@ async def refund_ticket(
         )
     
     try:
-        refund = stripe.Refund.create(
-            payment_intent=ticket.stripe_payment_intent_id,
-            amount=int(ticket.total_price * 100),  # Convert to cents
-        )
+        refund = await create_refund_async({
+            "payment_intent": ticket.stripe_payment_intent_id,
+            "amount": int(ticket.total_price * 100),  # Convert to cents
+        }, idempotency_key=f"refund-ticket-{ticket.id}")
     except stripe.error.StripeError as e:
         return ApiResponse(
             success=False,
@@ -259,7 +294,9 @@ async def refund_ticket(
     event = db.query(Event).filter(Event.id == ticket.event_id).first()
     if event:
         event.tickets_sold = max(0, event.tickets_sold - ticket.quantity)
+        bump_sales_rollup(db, event.id, event.manager_id, ticket.refund_at, tickets_refunded=ticket.quantity, refunded_amount=ticket.total_price)
     db.commit()
+    chat_auth_cache.invalidate_users([ticket.user_id])
     
     return ApiResponse(
         success=True,
@@ -275,32 +312,312 @@ async def refund_ticket(
     
 
 
-@router.get("/my-tickets", response_model=ApiResponse[List[TicketResponse]])
-async def get_my_tickets(
+@router.post("/events/{event_id}/cancel", response_model=ApiResponse[RefundJobOut])
+async def cancel_event_and_refund(
+    event_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_404_NOT_FOUND,
+            message="Event not found",
+            data=None
+        )
+    
+    if current_user['role'] != 'admin' and event.manager_id != current_user['id']:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message="You can only cancel your own events",
+            data=None
+        )
+    
+    job = db.query(EventRefundJob).filter(EventRefundJob.event_id == event_id, EventRefundJob.status.in_(["pending", "running"])).first()
+    if job:
+        return ApiResponse(
+            success=True,
+            statusCode=status.HTTP_200_OK,
+            message="Refund job already in progress",
+            data=RefundJobOut.model_validate(job)
+        )
+    
+    event.is_active = False
+    job = EventRefundJob(
+        event_id=event_id,
+        requested_by=current_user['id'],
+        status="pending"
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    
+    scheduler.run_now("refund_jobs")
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_202_ACCEPTED,
+        message="Event cancelled, refund job queued",
+        data=RefundJobOut.model_validate(job)
+    )
+    
+    
+
+
+@router.get("/refund-jobs/{job_id}", response_model=ApiResponse[RefundJobOut])
+def get_refund_job(
+    job_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(EventRefundJob).filter(EventRefundJob.id == job_id).first()
+    if not job:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_404_NOT_FOUND,
+            message="Refund job not found",
+            data=None
+        )
+    
+    if current_user['role'] != 'admin' and job.event.manager_id != current_user['id']:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message="Not allowed to view this refund job",
+            data=None
+        )
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Refund job retrieved",
+        data=RefundJobOut.model_validate(job)
+    )
+    
+    
+
+
+@router.post("/refund-jobs/{job_id}/retry", response_model=ApiResponse[RefundJobOut])
+def retry_refund_job(
+    job_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(EventRefundJob).filter(EventRefundJob.id == job_id).first()
+    if not job:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_404_NOT_FOUND,
+            message="Refund job not found",
+            data=None
+        )
+
+    if current_user['role'] != 'admin' and job.event.manager_id != current_user['id']:
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message="Not allowed to retry this refund job",
+            data=None
+        )
+
+    if job.status != "failed":
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_409_CONFLICT,
+            message=f"Only failed refund jobs can be retried (job is {job.status})",
+            data=None
+        )
+
+    # Picks up from last_ticket_id; tickets refunded before the failure stay refunded
+    job.status = "pending"
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+
+    # Sync route, so the scheduler is poked from the worker thread via the loop
+    from_thread.run_sync(scheduler.run_now, "refund_jobs")
+
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_202_ACCEPTED,
+        message="Refund job queued for retry",
+        data=RefundJobOut.model_validate(job)
+    )
+
+
+
+
+@router.get("/analytics", response_model=ApiResponse[List[EventSalesOut]])
+def get_sales_analytics(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    current_user: dict = Depends(require_event_manager),
+    db: Session = Depends(get_db)
+):
+    q = db.query(
+        EventSalesDaily.event_id,
+        func.sum(EventSalesDaily.tickets_sold),
+        func.sum(EventSalesDaily.gross_amount),
+        func.sum(EventSalesDaily.tickets_refunded),
+        func.sum(EventSalesDaily.refunded_amount),
+    )
+    
+    if current_user['role'] != 'admin':
+        q = q.filter(EventSalesDaily.manager_id == current_user['id'])
+    if date_from is not None:
+        q = q.filter(EventSalesDaily.day >= date_from)
+    if date_to is not None:
+        q = q.filter(EventSalesDaily.day <= date_to)
+    
+    rows = q.group_by(EventSalesDaily.event_id).order_by(EventSalesDaily.event_id.asc()).all()
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Sales analytics retrieved",
+        data=[EventSalesOut(
+            event_id=event_id,
+            tickets_sold=tickets_sold,
+            gross_amount=float(gross_amount),
+            tickets_refunded=tickets_refunded,
+            refunded_amount=float(refunded_amount),
+            net_amount=float(gross_amount - refunded_amount)
+        ) for event_id, tickets_sold, gross_amount, tickets_refunded, refunded_amount in rows]
+    )
+    
+    
+
+
+@router.get("/analytics/events/{event_id}", response_model=ApiResponse[EventSalesSeriesOut])
+def get_event_sales_analytics(
+    event_id: int,
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    current_user: dict = Depends(require_event_manager),
+    db: Session = Depends(get_db)
+):
+    q = db.query(EventSalesDaily).filter(EventSalesDaily.event_id == event_id)
+    
+    if current_user['role'] != 'admin':
+        q = q.filter(EventSalesDaily.manager_id == current_user['id'])
+    if date_from is not None:
+        q = q.filter(EventSalesDaily.day >= date_from)
+    if date_to is not None:
+        q = q.filter(EventSalesDaily.day <= date_to)
+    
+    rows = q.order_by(EventSalesDaily.day.asc()).all()
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Event sales analytics retrieved",
+        data=EventSalesSeriesOut(
+            event_id=event_id,
+            days=[SalesDayOut(
+                day=row.day,
+                tickets_sold=row.tickets_sold,
+                gross_amount=float(row.gross_amount),
+                tickets_refunded=row.tickets_refunded,
+                refunded_amount=float(row.refunded_amount),
+                net_amount=float(row.gross_amount - row.refunded_amount)
+            ) for row in rows]
+        )
+    )
+    
+    
+
+
+@router.post("/analytics/rebuild", response_model=ApiResponse[dict])
+def rebuild_sales_analytics(
+    event_id: Optional[int] = Query(None),
+    current_user: dict = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    if current_user['role'] != 'admin':
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_403_FORBIDDEN,
+            message="Admin access required",
+            data=None
+        )
+    
+    rows = rebuild_sales_rollup(db, event_id)
+    db.commit()
+    
+    return ApiResponse(
+        success=True,
+        statusCode=status.HTTP_200_OK,
+        message="Sales analytics rebuilt",
+        data={"event_id": event_id, "rows": rows}
+    )
+    
+    
+
+
+@router.get("/my-tickets", response_model=ApiResponse[TicketPages])
+def get_my_tickets(
+    before_purchases_at: Optional[datetime] = Query(None, description="Cursor: purchases_at of the last ticket on the previous page"),
+    before_id: Optional[int] = Query(None, description="Cursor: id of the last ticket on the previous page"),
+    payment_status: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    tickets = db.query(Ticket).filter(Ticket.user_id == current_user['id']).all()
-    ticket_responses = []
-    for ticket in tickets:
-        event = db.query(Event).filter(Event.id == ticket.event_id).first()
-        if event:
-            ticket_responses.append(TicketResponse(
-                id=ticket.id,
-                event_id=ticket.event_id,
-                event_title=event.title,
-                user_id=ticket.user_id,
-                quantity=ticket.quantity,
-                total_price=float(ticket.total_price),
-                payment_status=ticket.payment_status,
-                purchases_at=ticket.purchases_at,
-                refund_at=ticket.refund_at
-            ))
+    q = (
+        db.query(Ticket, Event.title)
+        .join(Event, Event.id == Ticket.event_id)
+        .filter(Ticket.user_id == current_user['id'])
+    )
+    
+    if payment_status is not None:
+        q = q.filter(Ticket.payment_status == payment_status)
+    
+    if (before_purchases_at is None) != (before_id is None):
+        return ApiResponse(
+            success=False,
+            statusCode=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            message="before_purchases_at and before_id must be given together",
+            data=None
+        )
+
+    if before_purchases_at is not None:
+        q = q.filter(tuple_(Ticket.purchases_at, Ticket.id) < tuple_(before_purchases_at, before_id))
+    
+    rows = (
+        q.order_by(Ticket.purchases_at.desc(), Ticket.id.desc())
+         .limit(limit + 1)
+         .all()
+    )
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    items = [TicketResponse(
+        id=ticket.id,
+        event_id=ticket.event_id,
+        event_title=event_title,
+        user_id=ticket.user_id,
+        quantity=ticket.quantity,
+        total_price=float(ticket.total_price),
+        payment_status=ticket.payment_status,
+        purchases_at=ticket.purchases_at,
+        refund_at=ticket.refund_at
+    ) for ticket, event_title in rows]
+    
+    last_ticket = rows[-1][0] if has_more and rows else None
+    
     return ApiResponse(
         success=True,
         statusCode=status.HTTP_200_OK,
         message="My tickets retrieved",
-        data=ticket_responses
+        data=TicketPages(
+            items=items,
+            next_before_purchases_at=last_ticket.purchases_at if last_ticket else None,
+            next_before_id=last_ticket.id if last_ticket else None,
+            has_more=has_more
+        )
     )
     
     
@@ -316,25 +633,14 @@ async def get_my_purchased_events(
 ):
     Manager = aliased(User)
     
-    base_query = (db.query(Ticket, Event, Manager, Chatroom).join(Event, Ticket.event_id == Event.id).join(Manager, Event.manager_id == Manager.id).outerjoin(Chatroom, (Chatroom.event_id == Ticket.event_id) & (Chatroom.user_id == Ticket.user_id)).filter(Ticket.user_id == current_user['id'], Ticket.payment_status == "paid").order_by(Ticket.purchases_at.desc()))
+    base_query = (db.query(Ticket, Event, Manager, Chatroom, func.count().over().label("total_count")).join(Event, Ticket.event_id == Event.id).join(Manager, Event.manager_id == Manager.id).outerjoin(Chatroom, (Chatroom.event_id == Ticket.event_id) & (Chatroom.user_id == Ticket.user_id)).filter(Ticket.user_id == current_user['id'], Ticket.payment_status == "paid").order_by(Ticket.purchases_at.desc()))
     
-    total_count = base_query.count()
     rows = (base_query.offset((page - 1) * limit).limit(limit).all())
+    total_count = rows[0].total_count if rows else (base_query.count() if page > 1 else 0)
     
     results: List[PurchasedEventChatItem] = []
     
-    for ticket, event, manager, chatroom in rows:
-        if chatroom is None:
-            chatroom = Chatroom(
-                event_id=event.id,
-                manager_id=event.manager_id,
-                user_id=ticket.user_id
-            )
-            db.add(chatroom)
-            db.commit()
-            db.refresh(chatroom)
-            
-            
+    for ticket, event, manager, chatroom, _ in rows:
         results.append(PurchasedEventChatItem(
             ticket_id=ticket.id,
             event_id=event.id,
@@ -343,7 +649,7 @@ async def get_my_purchased_events(
             manager_id=manager.id,
             manager_name=manager.username,
             manager_email=manager.email,
-            chatroom_id=chatroom.id,
+            chatroom_id=chatroom.id if chatroom else None,
             quantity=ticket.quantity,
             total_price=float(ticket.total_price),
             payment_status=ticket.payment_status,
@@ -380,14 +686,14 @@ async def get_my_customers(
 ):
     UserAlias = aliased(User)
     
-    base_query = (db.query(Ticket, Event, UserAlias, Chatroom).join(Ticket, Ticket.event_id == Event.id).join(UserAlias, Ticket.user_id == UserAlias.id).outerjoin(Chatroom, (Chatroom.event_id == Event.id) & (Chatroom.user_id == Ticket.user_id)).filter(Event.manager_id == current_user['id'], Ticket.payment_status == "paid").order_by(Event.event_date.desc(), Ticket.purchases_at.desc()))
+    base_query = (db.query(Ticket, Event, UserAlias, Chatroom, func.count().over().label("total_count")).join(Ticket, Ticket.event_id == Event.id).join(UserAlias, Ticket.user_id == UserAlias.id).outerjoin(Chatroom, (Chatroom.event_id == Event.id) & (Chatroom.user_id == Ticket.user_id)).filter(Event.manager_id == current_user['id'], Ticket.payment_status == "paid").order_by(Event.event_date.desc(), Ticket.purchases_at.desc()))
     
-    total_count = base_query.count()
     rows = base_query.offset((page - 1) * limit).limit(limit).all()
+    total_count = rows[0].total_count if rows else (base_query.count() if page > 1 else 0)
     
     event_customer_map = {}
     
-    for ticket, event, user, chatroom in rows:
+    for ticket, event, user, chatroom, _ in rows:
         if event.id not in event_customer_map:
             event_customer_map[event.id] = {
                 "event_id": event.id,
@@ -396,22 +702,12 @@ async def get_my_customers(
                 "customer": []
             }
         
-        if chatroom is None:
-            chatroom = Chatroom(
-                event_id=event.id,
-                manager_id=event.manager_id,
-                user_id=ticket.user_id
-            )
-            db.add(chatroom)
-            db.commit()
-            db.refresh(chatroom)
-            
         event_customer_map[event.id]["customer"].append(CustomerChatItem(
             ticket_id=ticket.id,
             user_id=user.id,
             user_name=user.username,
             user_email=user.email,
-            chatroom_id=chatroom.id,
+            chatroom_id=chatroom.id if chatroom else None,
             quantity=ticket.quantity,
             total_price=float(ticket.total_price),
             payment_status=ticket.payment_status,
@@ -0,0 +1,239 @@
+import asyncio
+from datetime import timedelta
+from typing import List, Optional, Set, Tuple
+import stripe
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import BigInteger, String, and_, case, column, func, or_, select, update, values
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.timeutils import utcnow
+from app.core.stripe_client import create_refund_async, expire_checkout_session_async
+from app.core.sales_rollup import bump_sales_rollup
+from app.core.chat.auth_cache import chat_auth_cache
+from app.database import SessionLocal, db_engine
+from app.models.refund import EventRefundJob
+from app.models.ticket import Ticket
+from app.models.event import Event
+
+
+running_jobs: Set[asyncio.Task] = set()
+
+
+def refundable_tickets(event_id: int, after_id: int):
+    return (
+        select(Ticket.id, Ticket.user_id, Ticket.stripe_payment_intent_id, Ticket.total_price, Ticket.quantity)
+        .where(
+            Ticket.event_id == event_id,
+            Ticket.payment_status == "paid",
+            Ticket.refund_id.is_(None),
+            Ticket.id > after_id,
+        )
+        .order_by(Ticket.id.asc())
+    )
+
+
+
+
+def queue_refund_job(db: Session, event_id: int) -> None:
+    # For a payment that completed after its event was cancelled: a running job
+    # may already be past that ticket, so a fresh job is queued unless one is
+    # still pending. Added to the caller's transaction.
+    pending = db.query(EventRefundJob.id).filter(EventRefundJob.event_id == event_id, EventRefundJob.status == "pending").first()
+    if pending is None:
+        db.add(EventRefundJob(event_id=event_id, status="pending"))
+
+
+
+
+def open_checkout_sessions(event_id: int) -> List[str]:
+    db = SessionLocal()
+    try:
+        return [row.stripe_session_id for row in db.query(Ticket.stripe_session_id).filter(
+            Ticket.event_id == event_id,
+            Ticket.payment_status == "pending",
+            Ticket.stripe_session_id.isnot(None),
+        )]
+    finally:
+        db.close()
+
+
+
+
+async def expire_checkout_session(session_id: str, slots: asyncio.Semaphore) -> None:
+    # A session that completed or expired meanwhile cannot be expired; its
+    # webhook settles the ticket (and queues a refund if it was paid)
+    async with slots:
+        try:
+            await expire_checkout_session_async(session_id)
+        except stripe.error.StripeError as e:
+            print(f"Could not expire checkout session {session_id}: {e}")
+
+
+
+
+def claim_refund_jobs(limit: int) -> List[Tuple[int, int, int]]:
+    # A running job whose heartbeat went stale belongs to a worker that died;
+    # it is picked up again and continues from its last checkpoint.
+    db = SessionLocal()
+    try:
+        now = utcnow()
+        stale = now - timedelta(seconds=settings.REFUND_JOB_STALE_SECONDS)
+        jobs = (
+            db.query(EventRefundJob)
+            .filter(or_(
+                EventRefundJob.status == "pending",
+                and_(EventRefundJob.status == "running", EventRefundJob.heartbeat_at < stale),
+            ))
+            .order_by(EventRefundJob.id.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        for job in jobs:
+            if job.started_at is None:
+                job.started_at = now
+                job.total_tickets = db.execute(
+                    select(func.count()).select_from(refundable_tickets(job.event_id, 0).subquery())
+                ).scalar() or 0
+            job.status = "running"
+            job.heartbeat_at = now
+
+        claimed = [(job.id, job.event_id, job.last_ticket_id) for job in jobs]
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+
+
+async def refund_ticket_row(row, slots: asyncio.Semaphore) -> Tuple[Optional[str], Optional[str]]:
+    async with slots:
+        try:
+            refund = await create_refund_async({
+                "payment_intent": row.stripe_payment_intent_id,
+                "amount": int(row.total_price * 100),
+            }, idempotency_key=f"refund-ticket-{row.id}")
+            return refund.id, None
+        except stripe.error.StripeError as e:
+            return None, f"Ticket {row.id}: {str(e)}"
+
+
+
+
+def apply_refund_batch(job_id: int, event_id: int, rows, results: List[Tuple[Optional[str], Optional[str]]]) -> None:
+    db = SessionLocal()
+    try:
+        now = utcnow()
+        refunded = [(row, refund_id) for row, (refund_id, _) in zip(rows, results) if refund_id]
+        errors = [error for _, error in results if error]
+
+        # Only tickets still paid and unrefunded change; one refunded meanwhile by
+        # the customer, or by a second runner after a stale takeover, is not
+        # counted again. Totals come from the rows actually updated.
+        applied = []
+        if refunded:
+            refunds = values(column("id", BigInteger), column("refund_id", String), name="refunds").data(
+                [(row.id, refund_id) for row, refund_id in refunded]
+            )
+            applied = db.execute(
+                update(Ticket)
+                .where(
+                    Ticket.id == refunds.c.id,
+                    Ticket.payment_status == "paid",
+                    Ticket.refund_id.is_(None),
+                )
+                .values(payment_status="refunded", refund_id=refunds.c.refund_id, refund_at=now)
+                .returning(Ticket.user_id, Ticket.quantity, Ticket.total_price)
+            ).all()
+
+        if applied:
+            quantity = sum(row.quantity for row in applied)
+            manager_id = db.execute(
+                update(Event)
+                .where(Event.id == event_id)
+                .values(tickets_sold=case((Event.tickets_sold > quantity, Event.tickets_sold - quantity), else_=0))
+                .returning(Event.manager_id)
+            ).scalar()
+            bump_sales_rollup(
+                db, event_id, manager_id, now,
+                tickets_refunded=quantity,
+                refunded_amount=sum(row.total_price for row in applied),
+            )
+
+        progress = {
+            EventRefundJob.refunded_tickets: EventRefundJob.refunded_tickets + len(applied),
+            EventRefundJob.failed_tickets: EventRefundJob.failed_tickets + len(errors),
+            EventRefundJob.last_ticket_id: rows[-1].id,
+            EventRefundJob.heartbeat_at: now,
+        }
+        if errors:
+            progress[EventRefundJob.last_error] = errors[-1]
+        db.query(EventRefundJob).filter(EventRefundJob.id == job_id).update(progress, synchronize_session=False)
+        db.commit()
+        chat_auth_cache.invalidate_users(row.user_id for row in applied)
+    finally:
+        db.close()
+
+
+
+
+def finish_refund_job(job_id: int, job_status: str, error: Optional[str] = None) -> None:
+    db = SessionLocal()
+    try:
+        outcome = {
+            EventRefundJob.status: job_status,
+            EventRefundJob.finished_at: utcnow(),
+        }
+        if error:
+            outcome[EventRefundJob.last_error] = error
+        db.query(EventRefundJob).filter(EventRefundJob.id == job_id).update(outcome, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+
+
+async def run_refund_job(job_id: int, event_id: int, after_id: int) -> None:
+    slots = asyncio.Semaphore(settings.REFUND_JOB_STRIPE_CONCURRENCY)
+
+    # Close open checkouts first, so no new payment lands behind the job
+    sessions = await run_in_threadpool(open_checkout_sessions, event_id)
+    await asyncio.gather(*(expire_checkout_session(session_id, slots) for session_id in sessions))
+
+    conn = await run_in_threadpool(db_engine.connect)
+    try:
+        # Server-side cursor: paid tickets are streamed batch by batch instead of
+        # being loaded into memory up front.
+        result = await run_in_threadpool(
+            conn.execution_options(yield_per=settings.REFUND_JOB_BATCH_SIZE).execute,
+            refundable_tickets(event_id, after_id),
+        )
+        batches = result.partitions()
+
+        while True:
+            rows = await run_in_threadpool(next, batches, None)
+            if rows is None:
+                break
+            results = await asyncio.gather(*(refund_ticket_row(row, slots) for row in rows))
+            await run_in_threadpool(apply_refund_batch, job_id, event_id, rows, list(results))
+
+        await run_in_threadpool(finish_refund_job, job_id, "completed")
+    except Exception as e:
+        print(f"Refund job {job_id} failed: {e}")
+        await run_in_threadpool(finish_refund_job, job_id, "failed", str(e))
+    finally:
+        await run_in_threadpool(conn.close)
+
+
+
+
+async def resume_refund_jobs() -> int:
+    claimed = await run_in_threadpool(claim_refund_jobs, settings.REFUND_JOB_MAX_CONCURRENT_JOBS)
+    for job_id, event_id, after_id in claimed:
+        task = asyncio.create_task(run_refund_job(job_id, event_id, after_id))
+        running_jobs.add(task)
+        task.add_done_callback(running_jobs.discard)
+    return len(claimed)
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+
+class ChatAuthCache:
+    # Remembers granted (user_id, room_id) pairs for a short TTL so reconnects
+    # skip the Chatroom and active-ticket queries. Only grants are cached.
+    # Entries are dropped when the user's tickets change payment status;
+    # other workers rely on the TTL. Invalidation runs from threadpool code
+    # too, hence the lock.
+
+    def __init__(self):
+        self.entries: "OrderedDict[Tuple[int, int], Tuple[float, int, Optional[str]]]" = OrderedDict()
+        self.by_user: Dict[int, Set[int]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, room_id: int) -> Optional[Tuple[int, Optional[str]]]:
+        # Returns (recipient_id, sender_name) for a live grant
+        with self.lock:
+            entry = self.entries.get((user_id, room_id))
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, user_id: int, room_id: int, recipient_id: int, sender_name: Optional[str]) -> None:
+        with self.lock:
+            key = (user_id, room_id)
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + settings.CHAT_AUTH_CACHE_TTL_SECONDS, recipient_id, sender_name)
+            self.by_user.setdefault(user_id, set()).add(room_id)
+
+            while len(self.entries) > settings.CHAT_AUTH_CACHE_MAX_ENTRIES:
+                (old_user, old_room), _ = self.entries.popitem(last=False)
+                self._forget(old_user, old_room)
+
+    def _forget(self, user_id: int, room_id: int) -> None:
+        rooms = self.by_user.get(user_id)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self.by_user[user_id]
+
+    def invalidate_users(self, user_ids: Iterable[Optional[int]]) -> None:
+        with self.lock:
+            for user_id in set(user_ids):
+                for room_id in self.by_user.pop(user_id, ()):
+                    self.entries.pop((user_id, room_id), None)
+
+    def invalidate_after_commit(self, db: Session, user_ids: Iterable[Optional[int]]) -> None:
+        # For code running inside a caller's transaction: dropping entries
+        # before the commit lets a reconnect re-cache the old ticket state
+        user_ids = list(user_ids)
+
+        @event.listens_for(db, "after_commit", once=True)
+        def invalidate(session: Session) -> None:
+            self.invalidate_users(user_ids)
+
+
+chat_auth_cache = ChatAuthCache()
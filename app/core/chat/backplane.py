@@ -0,0 +1,212 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+
+
+Deliver = Callable[[int, str], Awaitable[None]]
+
+# pg_notify rejects payloads of 8000 bytes or more
+NOTIFY_MAX_BYTES = 7900
+
+
+def room_channel(room_id: int) -> str:
+    return f"chat_room_{room_id}"
+
+
+
+
+class Backplane(ABC):
+    # Fans a serialized frame out to every process that has a socket in the room.
+    # Subscriptions are reference counted: the first local socket in a room
+    # subscribes the process, the last one to leave unsubscribes it.
+
+    # Largest serialized frame publish() accepts, None when unbounded
+    max_payload_bytes: Optional[int] = None
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+        self.refs: Dict[int, int] = {}
+
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+
+    async def stop(self) -> None:
+        self.refs.clear()
+
+    async def subscribe(self, room_id: int) -> None:
+        self.refs[room_id] = self.refs.get(room_id, 0) + 1
+        if self.refs[room_id] == 1:
+            await self._listen(room_id)
+
+    async def unsubscribe(self, room_id: int) -> None:
+        count = self.refs.get(room_id, 0) - 1
+        if count > 0:
+            self.refs[room_id] = count
+            return
+        self.refs.pop(room_id, None)
+        await self._unlisten(room_id)
+
+    @abstractmethod
+    async def publish(self, room_id: int, payload: str) -> None:
+        ...
+
+    @abstractmethod
+    async def _listen(self, room_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def _unlisten(self, room_id: int) -> None:
+        ...
+
+
+
+
+class InMemoryBackplane(Backplane):
+    # Single-process backplane for tests and one-worker deployments
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+
+    async def publish(self, room_id: int, payload: str) -> None:
+        if self.deliver is not None and room_id in self.refs:
+            await self.deliver(room_id, payload)
+
+    async def _listen(self, room_id: int) -> None:
+        pass
+
+    async def _unlisten(self, room_id: int) -> None:
+        pass
+
+
+
+
+class PostgresBackplane(Backplane):
+
+    max_payload_bytes = NOTIFY_MAX_BYTES
+
+    def __init__(self):
+        super().__init__()
+        self.listen_conn = None
+        self.listen_lock: Optional[asyncio.Lock] = None
+        self.publish_conns: List = []
+        self.publish_locks: List[asyncio.Lock] = []
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.reconnect_task: Optional[asyncio.Task] = None
+
+    async def _connect(self):
+        import asyncpg
+        from app.database import async_connect_args, async_url
+
+        # asyncpg outside the pool, so LISTEN state outlives any request and
+        # NOTIFY does not wait behind pooled transactions
+        dsn = async_url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return await asyncpg.connect(dsn, **async_connect_args)
+
+    async def _connect_listener(self):
+        # LISTEN/UNLISTEN are awaited rather than run on the loop thread, and
+        # notifications arrive as callbacks on the loop
+        conn = await self._connect()
+        conn.add_termination_listener(self._on_terminated)
+        return conn
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        self.listen_lock = asyncio.Lock()
+        self.listen_conn = await self._connect_listener()
+        self.publish_conns = [None] * settings.CHAT_BACKPLANE_PUBLISH_CONNECTIONS
+        self.publish_locks = [asyncio.Lock() for _ in self.publish_conns]
+        self.dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+        listen_conn, self.listen_conn = self.listen_conn, None
+        if listen_conn is not None and not listen_conn.is_closed():
+            await listen_conn.close(timeout=5)
+        publish_conns, self.publish_conns = self.publish_conns, []
+        for conn in publish_conns:
+            if conn is not None and not conn.is_closed():
+                await conn.close(timeout=5)
+        await super().stop()
+
+    async def _listen(self, room_id: int) -> None:
+        # One query at a time on the listener connection; while it is down the
+        # room is picked up by _reconnect from refs
+        async with self.listen_lock:
+            if self.listen_conn is not None and not self.listen_conn.is_closed():
+                await self.listen_conn.add_listener(room_channel(room_id), self._on_notify)
+
+    async def _unlisten(self, room_id: int) -> None:
+        async with self.listen_lock:
+            if self.listen_conn is not None and not self.listen_conn.is_closed():
+                await self.listen_conn.remove_listener(room_channel(room_id), self._on_notify)
+
+    async def publish(self, room_id: int, payload: str) -> None:
+        if len(payload.encode("utf-8")) > self.max_payload_bytes:
+            raise ValueError("Message too large for chat backplane")
+
+        # A room always publishes through the same connection, which keeps its
+        # NOTIFYs in order; rooms spread over the others. An asyncpg connection
+        # runs one query at a time, hence its lock.
+        slot = room_id % len(self.publish_conns)
+        async with self.publish_locks[slot]:
+            conn = self.publish_conns[slot]
+            if conn is None or conn.is_closed():
+                conn = self.publish_conns[slot] = await self._connect()
+            await conn.execute("SELECT pg_notify($1, $2)", room_channel(room_id), payload)
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        room_id = int(channel.rsplit("_", 1)[1])
+        self.inbox.put_nowait((room_id, payload))
+
+    def _on_terminated(self, conn) -> None:
+        # Also fires for the close in stop(), which clears listen_conn first
+        if conn is not self.listen_conn:
+            return
+        print("Chat backplane connection lost")
+        self.listen_conn = None
+        if self.reconnect_task is None:
+            self.reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _dispatch(self) -> None:
+        # A single consumer keeps frames in NOTIFY order
+        while True:
+            room_id, payload = await self.inbox.get()
+            try:
+                await self.deliver(room_id, payload)
+            except Exception as e:
+                print(f"Chat backplane delivery failed: {e}")
+
+    async def _reconnect(self) -> None:
+        delay = 1
+        while True:
+            conn = None
+            try:
+                async with self.listen_lock:
+                    conn = await self._connect_listener()
+                    for room_id in list(self.refs):
+                        await conn.add_listener(room_channel(room_id), self._on_notify)
+                    self.listen_conn = conn
+                self.reconnect_task = None
+                return
+            except Exception as e:
+                print(f"Chat backplane reconnect failed: {e}")
+                if conn is not None:
+                    conn.terminate()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+
+
+def create_backplane() -> Backplane:
+    if settings.CHAT_BACKPLANE == "memory":
+        return InMemoryBackplane()
+    return PostgresBackplane()
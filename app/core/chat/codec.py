@@ -0,0 +1,98 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+import msgpack
+
+
+# Negotiated through Sec-WebSocket-Protocol. Without a subprotocol, or with
+# chat.json, every frame is the JSON envelope. With chat.msgpack, server frames
+# are binary MessagePack maps with the short keys below, and the client may
+# send binary frames using the same keys. Text frames are always JSON.
+# Compression (permessage-deflate) is negotiated by the server itself;
+# uvicorn enables it by default (--ws-per-message-deflate).
+JSON_PROTOCOL = "chat.json"
+MSGPACK_PROTOCOL = "chat.msgpack"
+
+SHORT_KEYS = {
+    "success": "ok",
+    "statusCode": "c",
+    "message": "m",
+    "data": "d",
+    "seq": "s",
+    "room_id": "r",
+    "id": "i",
+    "sender_id": "f",
+    "recipient_id": "t",
+    "sender_name": "n",
+    "content": "x",
+    "created_at": "ts",
+    "reader_id": "rd",
+    "last_read_id": "lr",
+    "unread_count": "u",
+    "replayed": "rp",
+    "last_id": "li",
+    "has_more": "hm",
+    "room_ids": "rs",
+    "type": "y",
+    "up_to_id": "ut",
+}
+LONG_KEYS = {short: long for long, short in SHORT_KEYS.items()}
+
+
+
+
+def choose_subprotocol(offered: List[str]) -> Optional[str]:
+    if MSGPACK_PROTOCOL in offered:
+        return MSGPACK_PROTOCOL
+    if JSON_PROTOCOL in offered:
+        return JSON_PROTOCOL
+    return None
+
+
+def _shorten(value: Any) -> Any:
+    if isinstance(value, dict):
+        short = {}
+        for key, item in value.items():
+            if key == "created_at" and isinstance(item, str):
+                # Epoch milliseconds instead of a 32 byte ISO string
+                at = datetime.fromisoformat(item)
+                if at.tzinfo is None:
+                    at = at.replace(tzinfo=timezone.utc)
+                item = int(at.timestamp() * 1000)
+            short[SHORT_KEYS.get(key, key)] = _shorten(item)
+        return short
+    if isinstance(value, list):
+        return [_shorten(item) for item in value]
+    return value
+
+
+def _expand(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {LONG_KEYS.get(key, key): _expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+
+
+def pack_frame(payload: str) -> bytes:
+    # payload is the shared JSON frame; packed once per broadcast, not per socket
+    return msgpack.packb(_shorten(json.loads(payload)), use_bin_type=True)
+
+
+def stamp_packed(packed: bytes, seq: int, room_id: Optional[int]) -> bytes:
+    # Splices seq (and room) into the packed map by rewriting the map header,
+    # the binary twin of the JSON splice in ClientConnection._stamp
+    extra = {"s": seq} if room_id is None else {"s": seq, "r": room_id}
+    size = packed[0] & 0x0F
+    if packed[0] & 0xF0 != 0x80 or size + len(extra) > 15:
+        frame = msgpack.unpackb(packed, raw=False)
+        return msgpack.packb({**extra, **frame}, use_bin_type=True)
+
+    body = b"".join(msgpack.packb(key) + msgpack.packb(value) for key, value in extra.items())
+    return bytes([0x80 | (size + len(extra))]) + body + packed[1:]
+
+
+def unpack_frame(data: bytes) -> Any:
+    return _expand(msgpack.unpackb(data, raw=False))
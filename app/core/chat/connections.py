@@ -0,0 +1,300 @@
+import asyncio
+import json
+import time
+from typing import Dict, Iterable, Optional, Set
+from fastapi import WebSocket
+from app.core.config import settings
+from app.core.chat.backplane import Backplane
+from app.core.chat.codec import MSGPACK_PROTOCOL, pack_frame, stamp_packed
+from app.core.chat.recent import RecentMessages
+from app.core.chat.rate_limit import TokenBucket, connection_bucket, user_bucket
+
+
+class ClientConnection:
+    # Each socket gets its own bounded outbound queue and writer task, so a
+    # broadcast only enqueues and one slow client cannot hold up the room.
+    # A socket may be subscribed to one room or, on /chat/ws, to many.
+
+    def __init__(self, websocket: WebSocket, user_id: int, subprotocol: Optional[str] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.binary = subprotocol == MSGPACK_PROTOCOL
+        self.rooms: Set[int] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+        self.closer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.dropped = 0
+        self.seq = 0
+        self.seq_gap = 0
+        self.last_seen = time.monotonic()
+        self.answers_pings = False
+        self.bucket = connection_bucket()
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
+
+    def start(self) -> None:
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def send(self, payload: str, room_id: Optional[int] = None, packed: Optional[bytes] = None) -> None:
+        # packed is the MessagePack form of payload when the caller already has it
+        if self.closed:
+            return
+
+        if self.queue.full():
+            if settings.CHAT_SLOW_CONSUMER_POLICY == "disconnect":
+                # Closed right away, so no further frame is queued; the socket
+                # close itself needs the loop, and its task is kept until done
+                self._mark_closed()
+                self.closer = asyncio.create_task(self._close_socket(1013))
+                return
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.seq_gap += 1
+
+        self.queue.put_nowait((room_id, payload, packed))
+
+    def _next_seq(self) -> int:
+        # Numbers are given out as frames are written, skipping one for every
+        # frame dropped from the queue since the last write. Drops take the
+        # oldest queued frame, so the jump lands right where frames went missing.
+        self.seq += 1 + self.seq_gap
+        self.seq_gap = 0
+        return self.seq
+
+    def _stamp(self, payload: str, room_id: Optional[int]) -> str:
+        # Per-socket frame counter (and the room, so multiplexed clients can
+        # route frames) spliced into the shared serialized frame; a jump in seq
+        # tells the client frames were dropped and it should resume.
+        self._next_seq()
+        if room_id is None:
+            return '{"seq":%d,%s' % (self.seq, payload[1:])
+        return '{"seq":%d,"room_id":%d,%s' % (self.seq, room_id, payload[1:])
+
+    async def _write(self, payload: str, room_id: Optional[int], packed: Optional[bytes] = None) -> None:
+        if not self.binary:
+            await asyncio.wait_for(self.websocket.send_text(self._stamp(payload, room_id)), timeout=settings.CHAT_SEND_TIMEOUT_SECONDS)
+            return
+        frame = stamp_packed(packed if packed is not None else pack_frame(payload), self._next_seq(), room_id)
+        await asyncio.wait_for(self.websocket.send_bytes(frame), timeout=settings.CHAT_SEND_TIMEOUT_SECONDS)
+
+    async def send_now(self, payload: str, room_id: Optional[int] = None) -> None:
+        # Only for use before start(), while nothing else writes to the socket
+        await self._write(payload, room_id)
+
+    def discard_queued(self, message_ids: Set[int]) -> None:
+        # Live frames that arrived during a replay and were already replayed
+        kept = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            frame = json.loads(item[1])
+            if frame.get("message") == "New message" and frame["data"]["id"] in message_ids:
+                continue
+            kept.append(item)
+        for item in kept:
+            self.queue.put_nowait(item)
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                room_id, payload, packed = await self.queue.get()
+                await self._write(payload, room_id, packed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Closing makes the endpoint's receive loop exit and clean up
+            await self.close(code=1011)
+
+    def _mark_closed(self) -> None:
+        self.closed = True
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self._mark_closed()
+        await self._close_socket(code)
+
+
+
+
+class ConnectionManager:
+    # Sockets are indexed by room and by user; subscribe, unsubscribe and
+    # lookups are set operations, independent of how many rooms a socket holds.
+
+    def __init__(self, backplane: Backplane, recent: Optional[RecentMessages] = None):
+        self.active: Dict[int, Set[ClientConnection]] = {}
+        self.by_user: Dict[int, Set[ClientConnection]] = {}
+        self.user_buckets: Dict[int, TokenBucket] = {}
+        self.backplane = backplane
+        self.recent = recent
+        self.total_reaped = 0
+        self.total_rejected = 0
+        self.total_dropped = 0
+        self.total_rate_limited = 0
+
+    async def start(self) -> None:
+        await self.backplane.start(self.deliver)
+
+    async def stop(self) -> None:
+        for connections in list(self.by_user.values()):
+            for connection in list(connections):
+                await connection.close(code=1001)
+        await self.backplane.stop()
+
+    def register(self, user_id: int, websocket: WebSocket, start: bool = True, subprotocol: Optional[str] = None) -> ClientConnection:
+        # start=False queues live frames without sending them, so a caller can
+        # replay history first and then call connection.start()
+        connection = ClientConnection(websocket, user_id, subprotocol)
+        if start:
+            connection.start()
+        self.by_user.setdefault(user_id, set()).add(connection)
+        return connection
+
+    def user_at_limit(self, user_id: int) -> bool:
+        # Limits are per worker process
+        if len(self.by_user.get(user_id, ())) >= settings.CHAT_MAX_CONNECTIONS_PER_USER:
+            self.total_rejected += 1
+            return True
+        return False
+
+    def room_at_limit(self, room_id: int) -> bool:
+        if len(self.active.get(room_id, ())) >= settings.CHAT_MAX_CONNECTIONS_PER_ROOM:
+            self.total_rejected += 1
+            return True
+        return False
+
+    def allow(self, connection: ClientConnection) -> bool:
+        # Both the socket's own bucket and the one shared by all of the user's
+        # sockets in this process must have a token, so opening more sockets
+        # does not raise a user's rate
+        if connection.bucket.take():
+            bucket = self.user_buckets.get(connection.user_id)
+            if bucket is None:
+                bucket = self.user_buckets[connection.user_id] = user_bucket()
+            if bucket.take():
+                return True
+            connection.bucket.give_back()
+        self.total_rate_limited += 1
+        return False
+
+    async def subscribe(self, connection: ClientConnection, room_id: int) -> bool:
+        if room_id in connection.rooms:
+            return True
+        if self.room_at_limit(room_id):
+            return False
+        connection.rooms.add(room_id)
+        connections = self.active.setdefault(room_id, set())
+        connections.add(connection)
+        if len(connections) == 1:
+            await self.backplane.subscribe(room_id)
+        return True
+
+    async def unsubscribe(self, connection: ClientConnection, room_id: int) -> None:
+        if room_id not in connection.rooms:
+            return
+        connection.rooms.discard(room_id)
+        connections = self.active.get(room_id)
+        if connections is None:
+            return
+
+        connections.discard(connection)
+        if not connections:
+            del self.active[room_id]
+            await self.backplane.unsubscribe(room_id)
+            if self.recent is not None:
+                self.recent.drop(room_id)
+
+    async def connect(self, room_ids: Iterable[int], user_id: int, websocket: WebSocket, start: bool = True, subprotocol: Optional[str] = None) -> ClientConnection:
+        connection = self.register(user_id, websocket, start=start, subprotocol=subprotocol)
+        for room_id in room_ids:
+            await self.subscribe(connection, room_id)
+        return connection
+
+    async def disconnect(self, connection: ClientConnection) -> None:
+        if connection.writer is not None:
+            connection.writer.cancel()
+
+        for room_id in list(connection.rooms):
+            await self.unsubscribe(connection, room_id)
+
+        connections = self.by_user.get(connection.user_id)
+        if connections is not None and connection in connections:
+            connections.discard(connection)
+            if not connections:
+                del self.by_user[connection.user_id]
+            self.total_dropped += connection.dropped
+
+    async def heartbeat(self) -> int:
+        # Pings every socket. Only clients that have answered a ping before are
+        # reaped after the idle timeout with nothing received; clients that never
+        # pong are left to the server's protocol-level ping (uvicorn ws_ping_*),
+        # which ends half-open TCP connections for them.
+        now = time.monotonic()
+        ping = json.dumps({"success": True, "statusCode": 200, "message": "ping", "data": None})
+        reaped = 0
+
+        for connections in list(self.by_user.values()):
+            for connection in list(connections):
+                if connection.answers_pings and now - connection.last_seen > settings.CHAT_IDLE_TIMEOUT_SECONDS:
+                    await connection.close(code=1001)
+                    await self.disconnect(connection)
+                    reaped += 1
+                else:
+                    connection.send(ping)
+
+        # A user's bucket outlives their sockets until it has refilled, so
+        # reconnecting does not reset it
+        for user_id, bucket in list(self.user_buckets.items()):
+            bucket.refill()
+            if user_id not in self.by_user and bucket.tokens >= bucket.burst:
+                del self.user_buckets[user_id]
+
+        self.total_reaped += reaped
+        return reaped
+
+    def stats(self) -> dict:
+        connections = [connection for sockets in self.by_user.values() for connection in sockets]
+        return {
+            "connections": len(connections),
+            "users": len(self.by_user),
+            "rooms": len(self.active),
+            "room_subscriptions": sum(len(sockets) for sockets in self.active.values()),
+            "queued_frames": sum(connection.queue.qsize() for connection in connections),
+            "dropped_frames": self.total_dropped + sum(connection.dropped for connection in connections),
+            "reaped_connections": self.total_reaped,
+            "rejected_connections": self.total_rejected,
+            "rate_limited_frames": self.total_rate_limited,
+        }
+
+    def fits(self, message: dict) -> bool:
+        limit = self.backplane.max_payload_bytes
+        return limit is None or len(json.dumps(message).encode("utf-8")) <= limit
+
+    async def broadcast(self, room_id: int, message: dict) -> None:
+        # Serialized once here; every socket in every process gets the same string.
+        # A failed publish is only logged: the message is already accepted by the
+        # writer, and the caller's socket has no reason to go down over it.
+        try:
+            await self.backplane.publish(room_id, json.dumps(message))
+        except Exception as e:
+            print(f"Chat broadcast to room {room_id} failed: {e}")
+
+    async def deliver(self, room_id: int, payload: str) -> None:
+        # MessagePack sockets share one packed copy, made only if any are listening
+        packed = None
+        for connection in list(self.active.get(room_id, ())):
+            if connection.binary and packed is None:
+                packed = pack_frame(payload)
+            connection.send(payload, room_id, packed if connection.binary else None)
+
+        if self.recent is not None and room_id in self.active:
+            self.recent.add_frame(room_id, payload)
@@ -0,0 +1,143 @@
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+
+
+MASK_CHAR = "*"
+
+
+def fold(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters lower-case to two; keep offsets on the original
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+
+
+class TermMatcher:
+    # Aho-Corasick automaton over the casefolded terms: one pass over the
+    # message, one dict lookup per character, however many terms there are.
+    # Matches only count on word boundaries, so "class" does not hit "ass".
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Lengths of every term ending at a node, its own and via fail links
+        self.out: List[Tuple[int, ...]] = [()]
+        self.size = 0
+
+        for term in terms:
+            term = fold(term.strip())
+            if term:
+                self._add(term)
+        self._link()
+
+    def _add(self, term: str) -> None:
+        node = 0
+        for char in term:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = child
+        if len(term) not in self.out[node]:
+            self.out[node] += (len(term),)
+            self.size += 1
+
+    def _link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.out[child] = tuple(sorted(self.out[child] + self.out[self.fail[child]], reverse=True))
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        # (start, end) spans of whole-word matches, longest first per end position
+        goto, fail, out = self.goto, self.fail, self.out
+        spans = []
+        node = 0
+        for end, char in enumerate(fold(text), 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not out[node]:
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            for length in out[node]:
+                start = end - length
+                if start == 0 or not text[start - 1].isalnum():
+                    spans.append((start, end))
+                    break
+        return spans
+
+
+
+
+class ChatModerator:
+    # Holds the matcher for the banned-term file (one term per line). The file
+    # is re-read when its mtime changes; the new automaton is built off the
+    # event loop and swapped in whole, so messages never see a half-built one.
+
+    def __init__(self):
+        self.matcher = TermMatcher(())
+        self.loaded_mtime: Optional[float] = None
+
+    @property
+    def action(self) -> str:
+        return settings.CHAT_MODERATION_ACTION
+
+    def load(self, path: str) -> int:
+        with open(path, encoding="utf-8") as f:
+            terms = [line for line in f if line.strip() and not line.startswith("#")]
+        self.matcher = TermMatcher(terms)
+        return self.matcher.size
+
+    async def reload_if_changed(self) -> int:
+        path = settings.CHAT_BANNED_TERMS_FILE
+        if not path:
+            return 0
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as e:
+            print(f"Chat banned terms file unavailable: {e}")
+            return 0
+        if mtime == self.loaded_mtime:
+            return 0
+
+        loaded = await asyncio.to_thread(self.load, path)
+        self.loaded_mtime = mtime
+        print(f"Loaded {loaded} banned chat terms")
+        return loaded
+
+    def check(self, content: str) -> Tuple[Optional[str], bool]:
+        # (content to send, flagged); None means the message is rejected
+        spans = self.matcher.find(content) if self.matcher.size else []
+        if not spans:
+            return content, False
+
+        if self.action == "reject":
+            return None, False
+        if self.action == "flag":
+            return content, True
+
+        chars = list(content)
+        for start, end in spans:
+            chars[start:end] = MASK_CHAR * (end - start)
+        return "".join(chars), False
+
+
+chat_moderator = ChatModerator()
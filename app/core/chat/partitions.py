@@ -0,0 +1,174 @@
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.timeutils import add_months, month_start, utcnow
+from app.database import AsyncSessionLocal, async_engine
+from app.models.chat import ChatMessage
+
+
+# chat_messages is range partitioned by created_at, one partition per UTC month
+PARTITION_NAME = re.compile(r"^chat_messages_p(\d{4})_(\d{2})$")
+
+# Rooms are stamped by the app servers and messages by the database, so a
+# message can look older than its room by the drift between those clocks
+CLOCK_SLACK = timedelta(hours=1)
+
+LIST_PARTITIONS = text("""
+    SELECT c.relname, COALESCE(t.spcname, '') AS tablespace
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace
+    WHERE i.inhparent = 'chat_messages'::regclass
+""")
+
+# Left behind by an archive run that died before its swap
+LIST_ARCHIVE_COPIES = text("""
+    SELECT c.relname
+    FROM pg_class c
+    WHERE c.relkind = 'r' AND NOT c.relispartition AND c.relname ~ '^chat_messages_p[0-9]{4}_[0-9]{2}_archive$'
+""")
+
+LIST_FOREIGN_KEYS = text("""
+    SELECT pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = 'chat_messages'::regclass AND contype = 'f'
+""")
+
+# A partition stays hot while any of its messages belongs to an event that has not happened yet
+HAS_UPCOMING_EVENT = """
+    SELECT EXISTS (
+        SELECT 1
+        FROM {partition} m
+        JOIN chatrooms r ON r.id = m.room_id
+        JOIN events e ON e.id = r.event_id
+        WHERE e.event_date >= now()
+    )
+"""
+
+
+def partition_name(month: datetime) -> str:
+    return f"chat_messages_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> datetime:
+    match = PARTITION_NAME.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+
+def partition_bounds(month: datetime) -> str:
+    return f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def created_since(room_created_at: datetime):
+    # Lower created_at bound for messages of a room created at room_created_at;
+    # lets the planner skip every partition older than the room
+    return ChatMessage.__table__.c.created_at >= room_created_at - CLOCK_SLACK
+
+
+
+
+async def ensure_chat_partitions() -> int:
+    # Keeps the current month and CHAT_PARTITION_MONTHS_AHEAD future months in
+    # place, so an insert never lands on a missing partition
+    if async_engine.dialect.name != "postgresql":
+        return 0
+
+    current = month_start(utcnow())
+    created = 0
+    async with AsyncSessionLocal() as db:
+        existing = {row.relname for row in (await db.execute(LIST_PARTITIONS)).all()}
+        for ahead in range(settings.CHAT_PARTITION_MONTHS_AHEAD + 1):
+            start = add_months(current, ahead)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            await db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF chat_messages {partition_bounds(start)}"))
+            created += 1
+        await db.commit()
+    return created
+
+
+
+
+async def create_archive_copy(name: str, copy: str, month: datetime, quoted: str) -> None:
+    # An empty copy with the partition's columns, indexes and foreign keys, all
+    # in the archive tablespace. The keys are added while it is empty, so they
+    # validate instantly; the bounds check lets the attach skip its scan.
+    async with async_engine.begin() as conn:
+        await conn.execute(text(f"SET LOCAL default_tablespace = {quoted}"))
+        await conn.execute(text(f"CREATE TABLE {copy} (LIKE {name} INCLUDING ALL) TABLESPACE {quoted}"))
+        await conn.execute(text(
+            f"ALTER TABLE {copy} ADD CONSTRAINT {copy}_bounds "
+            f"CHECK (created_at >= '{month.isoformat()}' AND created_at < '{add_months(month, 1).isoformat()}')"
+        ))
+        for definition in (await conn.execute(LIST_FOREIGN_KEYS)).scalars().all():
+            await conn.execute(text(f"ALTER TABLE {copy} ADD {definition}"))
+
+
+async def swap_in_archive_copy(name: str, copy: str, month: datetime) -> None:
+    # The SHARE lock keeps the month's rows from changing while they are copied
+    # but lets reads through, so the partition stays attached and readable the
+    # whole time; a read receipt or cascade delete touching the month waits.
+    # Only the detach/attach at the end takes chat_messages exclusively, for
+    # catalog changes alone. Should it deadlock with such a waiting write,
+    # Postgres aborts one side; on any error this rolls back and leaves the
+    # original in place for the next run.
+    async with async_engine.begin() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+        await conn.execute(text(f"INSERT INTO {copy} SELECT * FROM {name}"))
+
+        await conn.execute(text("SET LOCAL lock_timeout = '1s'"))
+        await conn.execute(text(f"ALTER TABLE chat_messages DETACH PARTITION {name}"))
+        await conn.execute(text(f"ALTER TABLE chat_messages ATTACH PARTITION {copy} {partition_bounds(month)}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        await conn.execute(text(f"ALTER TABLE {copy} RENAME TO {name}"))
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {copy}_bounds"))
+
+
+
+
+async def archive_cold_chat_partitions() -> int:
+    # Moves the oldest cold partition, one older than CHAT_ARCHIVE_AFTER_MONTHS
+    # whose events have all taken place, with its indexes into
+    # CHAT_ARCHIVE_TABLESPACE (meant to sit on compressed storage). SET
+    # TABLESPACE would hold an ACCESS EXCLUSIVE lock for the whole rewrite, so
+    # a copy is built in the tablespace instead and swapped in for the
+    # original; history and search see the month throughout.
+    tablespace = settings.CHAT_ARCHIVE_TABLESPACE
+    if async_engine.dialect.name != "postgresql" or not tablespace:
+        return 0
+
+    cutoff = add_months(month_start(utcnow()), -settings.CHAT_ARCHIVE_AFTER_MONTHS)
+    quoted = async_engine.dialect.identifier_preparer.quote(tablespace)
+
+    async with async_engine.connect() as conn:
+        # VACUUM cannot run inside a transaction
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SET lock_timeout = '5s'"))
+
+        for copy in (await conn.execute(LIST_ARCHIVE_COPIES)).scalars().all():
+            await conn.execute(text(f"DROP TABLE {copy}"))
+
+        partitions = sorted((await conn.execute(LIST_PARTITIONS)).all())
+        for name, current_tablespace in partitions:
+            if PARTITION_NAME.match(name) is None or current_tablespace == tablespace:
+                continue
+            start = partition_month(name)
+            if add_months(start, 1) > cutoff:
+                break
+            if await conn.scalar(text(HAS_UPCOMING_EVENT.format(partition=name))):
+                continue
+
+            copy = f"{name}_archive"
+            await create_archive_copy(name, copy, start, quoted)
+            try:
+                await swap_in_archive_copy(name, copy, start)
+            except Exception:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {copy}"))
+                raise
+            await conn.execute(text(f"VACUUM (FREEZE, ANALYZE) {name}"))
+            print(f"Archived chat partition {name} to tablespace {tablespace}")
+            return 1
+    return 0
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from typing import Iterable, Tuple
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.chat import Chatroom
+from app.models.event import Event
+from app.models.ticket import Ticket
+
+
+def provision_chatrooms(db: Session, rooms: Iterable[Tuple[int, int, int]]) -> None:
+    # rooms are (event_id, manager_id, user_id); existing rooms are left untouched
+    # through ix_chatrooms_event_manager_user, so this is safe to call on every payment.
+    now = datetime.now(timezone.utc)
+    values = [
+        {"event_id": event_id, "manager_id": manager_id, "user_id": user_id, "created_at": now}
+        for event_id, manager_id, user_id in set(rooms)
+        if manager_id is not None and user_id is not None
+    ]
+    if not values:
+        return
+
+    db.execute(
+        insert(Chatroom)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=["event_id", "manager_id", "user_id"])
+    )
+
+
+
+
+def backfill_chatrooms(batch_size: int = 5000) -> int:
+    # One-off repair for paid tickets that predate provisioning at payment time
+    db = SessionLocal()
+    inserted = 0
+    last_id = 0
+    try:
+        while True:
+            batch = (
+                select(Ticket.id, Ticket.event_id, Ticket.user_id)
+                .where(Ticket.payment_status == "paid", Ticket.id > last_id)
+                .order_by(Ticket.id.asc())
+                .limit(batch_size)
+                .subquery()
+            )
+            max_id = db.execute(select(batch.c.id).order_by(batch.c.id.desc()).limit(1)).scalar()
+            if max_id is None:
+                break
+
+            missing = (
+                select(batch.c.event_id, Event.manager_id, batch.c.user_id, literal(datetime.now(timezone.utc)))
+                .join(Event, Event.id == batch.c.event_id)
+                .where(Event.manager_id.isnot(None), batch.c.user_id.isnot(None))
+                .distinct()
+            )
+            result = db.execute(
+                insert(Chatroom)
+                .from_select(["event_id", "manager_id", "user_id", "created_at"], missing)
+                .on_conflict_do_nothing(index_elements=["event_id", "manager_id", "user_id"])
+            )
+            db.commit()
+
+            inserted += result.rowcount or 0
+            last_id = max_id
+        return inserted
+    finally:
+        db.close()
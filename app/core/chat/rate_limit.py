@@ -0,0 +1,38 @@
+import time
+from app.core.config import settings
+
+
+class TokenBucket:
+    # Refills at rate tokens per second up to burst; each client frame that
+    # costs a write or a broadcast takes one.
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def give_back(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+
+
+def connection_bucket() -> TokenBucket:
+    return TokenBucket(settings.CHAT_RATE_PER_SECOND, settings.CHAT_RATE_BURST)
+
+
+def user_bucket() -> TokenBucket:
+    return TokenBucket(settings.CHAT_USER_RATE_PER_SECOND, settings.CHAT_USER_RATE_BURST)
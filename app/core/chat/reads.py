@@ -0,0 +1,74 @@
+from typing import Optional, Tuple
+from sqlalchemy import func, select, update
+from app.core.chat.partitions import created_since
+from app.core.chat.writer import message_writer
+from app.database import AsyncSessionLocal
+from app.models.chat import Chatroom, ChatMessage
+
+
+chatrooms = Chatroom.__table__
+chat_messages = ChatMessage.__table__
+
+
+
+
+async def mark_read(room_id: int, reader_id: int, up_to_id: int) -> Tuple[Optional[dict], bool]:
+    # Returns (receipt, changed); receipt is None when the reader is not in the room.
+    # The read mark only moves forward, so repeated or out-of-order calls are no-ops,
+    # and never past the room's last message, so a made-up id cannot mark
+    # messages read before they are sent.
+    await message_writer.wait_for_room(room_id)
+    async with AsyncSessionLocal() as db:
+        room = (await db.execute(
+            select(chatrooms.c.user_id, chatrooms.c.manager_id, chatrooms.c.user_last_read_id,
+                   chatrooms.c.manager_last_read_id, chatrooms.c.user_unread_count, chatrooms.c.manager_unread_count,
+                   chatrooms.c.last_message_id, chatrooms.c.created_at)
+            .where(chatrooms.c.id == room_id)
+        )).first()
+        if room is None or reader_id not in (room.user_id, room.manager_id):
+            return None, False
+        up_to_id = min(up_to_id, room.last_message_id or 0)
+
+        if reader_id == room.user_id:
+            last_read, unread = chatrooms.c.user_last_read_id, chatrooms.c.user_unread_count
+            receipt = {"room_id": room_id, "reader_id": reader_id, "last_read_id": room.user_last_read_id, "unread_count": room.user_unread_count}
+        else:
+            last_read, unread = chatrooms.c.manager_last_read_id, chatrooms.c.manager_unread_count
+            receipt = {"room_id": room_id, "reader_id": reader_id, "last_read_id": room.manager_last_read_id, "unread_count": room.manager_unread_count}
+
+        still_unread = (
+            select(func.count())
+            .select_from(chat_messages)
+            .where(
+                chat_messages.c.room_id == room_id,
+                created_since(room.created_at),
+                chat_messages.c.recipient_id == reader_id,
+                chat_messages.c.id > up_to_id,
+            )
+            .scalar_subquery()
+        )
+        moved = (await db.execute(
+            update(chatrooms)
+            .where(chatrooms.c.id == room_id, last_read < up_to_id)
+            .values({last_read: up_to_id, unread: still_unread})
+            .returning(unread)
+        )).first()
+        if moved is None:
+            return receipt, False
+
+        await db.execute(
+            update(chat_messages)
+            .where(
+                chat_messages.c.room_id == room_id,
+                created_since(room.created_at),
+                chat_messages.c.recipient_id == reader_id,
+                chat_messages.c.id <= up_to_id,
+                chat_messages.c.is_read.is_(False),
+            )
+            .values(is_read=True)
+        )
+        await db.commit()
+
+    receipt["last_read_id"] = up_to_id
+    receipt["unread_count"] = moved[0]
+    return receipt, True
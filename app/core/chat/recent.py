@@ -0,0 +1,115 @@
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.schemas.chat import MessageOut
+
+
+# Rough per-message overhead of the MessageOut object and its bookkeeping
+MESSAGE_OVERHEAD_BYTES = 400
+
+
+def message_size(message: MessageOut) -> int:
+    return len(message.content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+
+
+class RoomBuffer:
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.messages: Dict[int, MessageOut] = {}
+        self.size = 0
+        self.seeded = False
+
+
+
+
+class RecentMessages:
+    # Newest messages of the rooms this process is subscribed to, fed from the
+    # backplane so messages sent through other workers land here too. A buffer
+    # is opened before the room's pending writes are settled, collects
+    # deliveries from then on, and is only trusted once seeded from a page read
+    # after that. It is dropped when the last local socket leaves, since
+    # deliveries stop from then on.
+
+    def __init__(self):
+        self.rooms: "OrderedDict[int, RoomBuffer]" = OrderedDict()
+        self.size = 0
+
+    def open(self, room_id: int) -> RoomBuffer:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = RoomBuffer()
+        return room
+
+    def seed(self, room_id: int, room: RoomBuffer, messages: Iterable[MessageOut]) -> None:
+        # Only the buffer that was open before the read; one dropped and
+        # reopened meanwhile may have missed deliveries the read did not cover
+        if self.rooms.get(room_id) is not room:
+            return
+        self.add(room_id, messages)
+        room.seeded = True
+
+    def add(self, room_id: int, messages: Iterable[MessageOut]) -> None:
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        self.rooms.move_to_end(room_id)
+
+        for message in messages:
+            if message.id in room.messages:
+                continue
+            insort(room.ids, message.id)
+            room.messages[message.id] = message
+            room.size += message_size(message)
+            self.size += message_size(message)
+
+        while len(room.ids) > settings.CHAT_RECENT_PER_ROOM:
+            oldest = room.messages.pop(room.ids.pop(0))
+            room.size -= message_size(oldest)
+            self.size -= message_size(oldest)
+
+        while self.size > settings.CHAT_RECENT_MAX_BYTES and len(self.rooms) > 1:
+            _, evicted = self.rooms.popitem(last=False)
+            self.size -= evicted.size
+
+    def add_frame(self, room_id: int, payload: str) -> None:
+        if room_id not in self.rooms:
+            return
+        frame = json.loads(payload)
+        if frame.get("message") != "New message":
+            return
+        self.add(room_id, [MessageOut(**frame["data"])])
+
+    def drop(self, room_id: int) -> None:
+        room = self.rooms.pop(room_id, None)
+        if room is not None:
+            self.size -= room.size
+
+    def page(self, room_id: int, before_id: Optional[int], limit: int) -> Optional[Tuple[List[MessageOut], bool]]:
+        # Served only when the buffer holds more than a page below the cursor,
+        # otherwise it cannot tell whether older rows are missing from it.
+        room = self.rooms.get(room_id)
+        if room is None or not room.seeded:
+            return None
+
+        end = bisect_left(room.ids, before_id) if before_id is not None else len(room.ids)
+        if end <= limit:
+            return None
+
+        self.rooms.move_to_end(room_id)
+        return [room.messages[message_id] for message_id in room.ids[end - limit:end]], True
+
+    def page_after(self, room_id: int, after_id: int, limit: int) -> Optional[Tuple[List[MessageOut], bool]]:
+        # Everything newer than the oldest buffered message has been seen here,
+        # so a cursor at or past it can be answered from the buffer alone.
+        room = self.rooms.get(room_id)
+        if room is None or not room.seeded or not room.ids or after_id < room.ids[0]:
+            return None
+
+        self.rooms.move_to_end(room_id)
+        start = bisect_right(room.ids, after_id)
+        return [room.messages[message_id] for message_id in room.ids[start:start + limit]], len(room.ids) > start + limit
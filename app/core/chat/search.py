@@ -0,0 +1,112 @@
+import html
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import func, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+from app.core.chat.partitions import created_since
+from app.models.auth import User
+from app.models.chat import Chatroom, ChatMessage
+from app.schemas.chat import MessageSearchHit
+
+
+# Text search configuration of ix_chat_messages_content_fts; a query only uses
+# the index when its to_tsvector() call matches the index expression exactly
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+
+# Matches are delimited with control characters nobody types; the snippet is
+# HTML-escaped first and only then gets its <mark> tags, so message content
+# cannot inject markup into clients that render snippets as HTML
+MARK_START = "\x02"
+MARK_STOP = "\x03"
+
+HEADLINE_OPTIONS = f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", MaxWords=20, MinWords=8, MaxFragments=2'
+
+SQLITE_SEARCH = text("""
+    SELECT m.id, m.room_id, m.sender_id, u.username AS sender_name, m.created_at,
+           snippet(chat_messages_fts, 0, :mark_start, :mark_stop, '...', 16) AS snippet
+    FROM chat_messages_fts
+    JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+    LEFT JOIN users u ON u.id = m.sender_id
+    WHERE chat_messages_fts MATCH :query
+      AND m.room_id IN (SELECT id FROM chatrooms WHERE user_id = :user_id OR manager_id = :user_id)
+      AND m.id < :before_id
+    ORDER BY m.id DESC
+    LIMIT :limit
+""")
+
+
+
+
+def render_snippet(snippet: str) -> str:
+    return html.escape(snippet).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+def participant_rooms(user_id: int):
+    return select(Chatroom.id).where(or_(Chatroom.user_id == user_id, Chatroom.manager_id == user_id))
+
+
+def search_postgres(db: Session, user_id: int, q: str, before_id: Optional[int], limit: int):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+    # Partitions older than the user's first room cannot hold their messages
+    first_room_at = db.scalar(select(func.min(Chatroom.created_at)).where(
+        or_(Chatroom.user_id == user_id, Chatroom.manager_id == user_id)
+    ))
+    if first_room_at is None:
+        return []
+
+    # Matching ids come off the GIN index; headlines are only built for the page
+    page = (
+        select(ChatMessage.id)
+        .where(
+            func.to_tsvector(SEARCH_CONFIG, ChatMessage.content).op("@@")(query),
+            ChatMessage.room_id.in_(participant_rooms(user_id)),
+            created_since(first_room_at),
+        )
+        .order_by(ChatMessage.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        page = page.where(ChatMessage.id < before_id)
+    page = page.subquery()
+
+    return db.execute(
+        select(
+            ChatMessage.id,
+            ChatMessage.room_id,
+            ChatMessage.sender_id,
+            User.username.label("sender_name"),
+            ChatMessage.created_at,
+            func.ts_headline(SEARCH_CONFIG, ChatMessage.content, query, HEADLINE_OPTIONS).label("snippet"),
+        )
+        .join(page, page.c.id == ChatMessage.id)
+        .outerjoin(User, User.id == ChatMessage.sender_id)
+        .order_by(ChatMessage.id.desc())
+    ).all()
+
+
+def search_sqlite(db: Session, user_id: int, q: str, before_id: Optional[int], limit: int):
+    # Every word is quoted, so FTS5 operators in user input are matched as text
+    words = re.findall(r"\w+", q)
+    if not words:
+        return []
+    query = " ".join('"%s"' % word for word in words)
+
+    return db.execute(SQLITE_SEARCH, {
+        "query": query,
+        "user_id": user_id,
+        "before_id": before_id if before_id is not None else 2 ** 63 - 1,
+        "limit": limit,
+        "mark_start": MARK_START,
+        "mark_stop": MARK_STOP,
+    }).all()
+
+
+
+
+def search_messages(db: Session, user_id: int, q: str, before_id: Optional[int], limit: int) -> Tuple[List[MessageSearchHit], bool]:
+    # Newest matches first, keyset-paged on id, only in rooms the user is part of
+    search = search_sqlite if db.get_bind().dialect.name == "sqlite" else search_postgres
+    rows = search(db, user_id, q, before_id, limit + 1)
+    hits = [MessageSearchHit(**{**row._mapping, "snippet": render_snippet(row.snippet)}) for row in rows[:limit]]
+    return hits, len(rows) > limit
@@ -0,0 +1,254 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, case, delete, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat import Chatroom, ChatMessage, PendingChatMessage
+
+
+PREVIEW_CHARS = 200
+
+chatrooms = Chatroom.__table__
+pending_messages = PendingChatMessage.__table__
+
+
+bump_last_message = (
+    update(chatrooms)
+    .where(
+        chatrooms.c.id == bindparam("room"),
+        or_(chatrooms.c.last_message_id.is_(None), chatrooms.c.last_message_id < bindparam("message")),
+    )
+    .values(
+        last_message_id=bindparam("message"),
+        last_message_preview=bindparam("preview"),
+        last_message_at=bindparam("at"),
+    )
+)
+
+# A message only counts as unread if it is newer than the recipient's read mark,
+# which can already be ahead of it when the reader acted on the broadcast.
+bump_unread = (
+    update(chatrooms)
+    .where(chatrooms.c.id == bindparam("room"))
+    .values(
+        user_unread_count=chatrooms.c.user_unread_count + case(
+            (and_(chatrooms.c.user_id == bindparam("recipient"), chatrooms.c.user_last_read_id < bindparam("message")), 1),
+            else_=0,
+        ),
+        manager_unread_count=chatrooms.c.manager_unread_count + case(
+            (and_(chatrooms.c.manager_id == bindparam("recipient"), chatrooms.c.manager_last_read_id < bindparam("message")), 1),
+            else_=0,
+        ),
+    )
+)
+
+
+
+
+def latest_per_room(rows: List[dict]) -> List[dict]:
+    # The room inbox only needs the newest message of each room in the batch
+    latest: Dict[int, dict] = {}
+    for row in rows:
+        current = latest.get(row["room_id"])
+        if current is None or row["id"] > current["id"]:
+            latest[row["room_id"]] = row
+    return [
+        {"room": row["room_id"], "message": row["id"], "preview": row["content"][:PREVIEW_CHARS], "at": row["created_at"]}
+        for row in latest.values()
+    ]
+
+
+
+
+class ChatMessageWriter:
+    # Write-behind pipeline: a message gets its id and timestamp up front, is
+    # broadcast right away, and lands in chat_messages with the rest of its
+    # batch in one multi-row insert. The returned future is the durability ack.
+
+    def __init__(self):
+        self.pending: List[Tuple[dict, asyncio.Future]] = []
+        self.in_flight: List[Tuple[dict, asyncio.Future]] = []
+        self.has_pending: Optional[asyncio.Event] = None
+        self.batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _allocate_id(self, room_id: int) -> Tuple[int, datetime]:
+        # One nextval per message, with the timestamp from the same database
+        # clock, so ids follow send order across every worker: read marks, the
+        # room's last message, history paging and replay all rely on it. The
+        # same statement records the id as pending until its batch is written.
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                insert(PendingChatMessage)
+                .values(id=func.nextval("chat_messages_id_seq"), room_id=room_id, created_at=func.clock_timestamp())
+                .returning(PendingChatMessage.id, PendingChatMessage.created_at)
+            )).one()
+            await db.commit()
+            return row.id, row.created_at
+
+    async def submit(self, room_id: int, sender_id: int, sender_name: Optional[str], recipient_id: int, content: str, flagged: bool = False) -> Tuple[dict, asyncio.Future]:
+        message_id, created_at = await self._allocate_id(room_id)
+        row = {
+            "id": message_id,
+            "room_id": room_id,
+            "sender_id": sender_id,
+            "recipient_id": recipient_id,
+            "content": content,
+            "is_read": False,
+            "is_flagged": flagged,
+            "created_at": created_at,
+        }
+        saved = asyncio.get_running_loop().create_future()
+
+        self.pending.append((row, saved))
+        self.has_pending.set()
+        if len(self.pending) >= settings.CHAT_WRITE_BATCH_SIZE:
+            self.batch_full.set()
+
+        message = {key: row[key] for key in ("id", "room_id", "sender_id", "recipient_id", "content")}
+        message["sender_name"] = sender_name
+        message["created_at"] = row["created_at"].isoformat()
+        return message, saved
+
+    async def _insert(self, rows: List[dict]) -> None:
+        # ON CONFLICT keeps a retry harmless when a commit went through but its
+        # acknowledgement was lost; only rows inserted now touch the room counters.
+        # The key includes created_at, the partition key; a retried row keeps its own.
+        async with AsyncSessionLocal() as db:
+            inserted_ids = set((await db.execute(
+                insert(ChatMessage).on_conflict_do_nothing(index_elements=["id", "created_at"]).returning(ChatMessage.id),
+                rows,
+            )).scalars().all())
+            inserted = [row for row in rows if row["id"] in inserted_ids]
+
+            if inserted:
+                await db.execute(bump_last_message, latest_per_room(inserted))
+                await db.execute(bump_unread, [
+                    {"room": row["room_id"], "recipient": row["recipient_id"], "message": row["id"]}
+                    for row in inserted
+                ])
+            await db.execute(delete(pending_messages).where(pending_messages.c.id.in_([row["id"] for row in rows])))
+            await db.commit()
+
+    async def _release(self, rows: List[dict]) -> None:
+        # A batch that is given up is no longer pending either
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(pending_messages).where(pending_messages.c.id.in_([row["id"] for row in rows])))
+                await db.commit()
+        except Exception as e:
+            print(f"Releasing failed chat batch failed: {e}")
+
+    async def flush(self) -> int:
+        batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+
+        rows = [row for row, _ in batch]
+        error: Optional[Exception] = None
+        self.in_flight = batch
+        try:
+            for attempt in range(1, settings.CHAT_WRITE_MAX_ATTEMPTS + 1):
+                try:
+                    await self._insert(rows)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    print(f"Chat write batch failed (attempt {attempt}): {e}")
+                    await asyncio.sleep(0.1 * attempt)
+        except asyncio.CancelledError:
+            # Shutdown mid-flush: hand the batch back so stop() writes it
+            self.pending = batch + self.pending
+            raise
+        finally:
+            self.in_flight = []
+
+        if error is not None:
+            await self._release(rows)
+
+        for row, saved in batch:
+            if saved.done():
+                continue
+            if error is None:
+                saved.set_result(row["id"])
+            else:
+                saved.set_exception(error)
+        return len(batch)
+
+    async def wait_for_room(self, room_id: int) -> None:
+        # Until every message this worker accepted for the room is written (or
+        # failed), so a read right after sees what its caller was already sent
+        waiting = [saved for row, saved in self.in_flight + self.pending if row["room_id"] == room_id]
+        if waiting:
+            await asyncio.wait(waiting)
+
+    async def settle_room(self, room_id: int) -> bool:
+        # Until every message allocated for the room so far, by any worker, is
+        # written or given up. Called after subscribing: anything allocated
+        # later is broadcast after the subscribe and arrives live instead.
+        # False when rows are still pending at the deadline.
+        await self.wait_for_room(room_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.CHAT_SETTLE_TIMEOUT_SECONDS
+        # Rows already older than the timeout belong to a worker that died mid-batch
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.CHAT_SETTLE_TIMEOUT_SECONDS)
+        async with AsyncSessionLocal() as db:
+            upto = await db.scalar(select(func.max(pending_messages.c.id)).where(pending_messages.c.room_id == room_id))
+            while upto is not None:
+                waiting = await db.scalar(select(exists().where(
+                    pending_messages.c.room_id == room_id,
+                    pending_messages.c.id <= upto,
+                    pending_messages.c.created_at > stale,
+                )))
+                await db.commit()
+                if not waiting:
+                    return True
+                if loop.time() >= deadline:
+                    return False
+                await asyncio.sleep(settings.CHAT_WRITE_FLUSH_MS / 1000)
+        return True
+
+    async def purge_stale(self) -> int:
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.CHAT_SETTLE_TIMEOUT_SECONDS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(pending_messages).where(pending_messages.c.created_at < stale))
+            await db.commit()
+            return result.rowcount
+
+    async def _run(self) -> None:
+        while True:
+            await self.has_pending.wait()
+            if len(self.pending) < settings.CHAT_WRITE_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self.batch_full.wait(), timeout=settings.CHAT_WRITE_FLUSH_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            self.has_pending.clear()
+            self.batch_full.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self.has_pending = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Whatever was accepted before shutdown still gets written
+        while self.pending:
+            await self.flush()
+
+
+message_writer = ChatMessageWriter()
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -37,6 +38,64 @@ class Settings(BaseSettings):
     STRIPE_WEBHOOK_SECRET: str
     FRONTEND_URL: str
     
+    STRIPE_API_BASE: Optional[str]=None
+    STRIPE_TIMEOUT_SECONDS: float=20.0
+    STRIPE_MAX_NETWORK_RETRIES: int=2
+    STRIPE_MAX_CONCURRENCY: int=20
+    STRIPE_SESSION_LIFETIME_MINUTES: int=60
+    CHECKOUT_REUSE_MIN_REMAINING_MINUTES: int=5
+    
+    TICKET_SWEEP_INTERVAL_SECONDS: int=300
+    TICKET_SWEEP_GRACE_MINUTES: int=10
+    TICKET_SWEEP_BATCH_SIZE: int=100
+    TICKET_SWEEP_MAX_BATCHES: int=20
+    TICKET_SWEEP_STRIPE_CONCURRENCY: int=5
+    TICKET_SWEEP_CLAIM_SECONDS: int=120
+    
+    REFUND_JOB_POLL_SECONDS: int=60
+    REFUND_JOB_STALE_SECONDS: int=300
+    REFUND_JOB_BATCH_SIZE: int=100
+    REFUND_JOB_STRIPE_CONCURRENCY: int=10
+    REFUND_JOB_MAX_CONCURRENT_JOBS: int=2
+    
+    CHAT_BACKPLANE: str='postgres'
+    CHAT_BACKPLANE_PUBLISH_CONNECTIONS: int=4
+    CHAT_MAX_MESSAGE_CHARS: int=1000
+    CHAT_SEND_QUEUE_SIZE: int=100
+    CHAT_SEND_TIMEOUT_SECONDS: float=10.0
+    CHAT_SLOW_CONSUMER_POLICY: str='drop_oldest'
+    CHAT_WRITE_BATCH_SIZE: int=200
+    CHAT_WRITE_FLUSH_MS: int=20
+    CHAT_WRITE_MAX_ATTEMPTS: int=3
+    CHAT_RECENT_PER_ROOM: int=200
+    CHAT_RECENT_MAX_BYTES: int=32 * 1024 * 1024
+    CHAT_REPLAY_MAX: int=200
+    CHAT_SETTLE_TIMEOUT_SECONDS: float=2.0
+    CHAT_PENDING_PURGE_SECONDS: int=3600
+    CHAT_PING_INTERVAL_SECONDS: int=25
+    CHAT_IDLE_TIMEOUT_SECONDS: int=75
+    CHAT_MAX_CONNECTIONS_PER_USER: int=10
+    CHAT_MAX_CONNECTIONS_PER_ROOM: int=20
+    CHAT_AUTH_CACHE_TTL_SECONDS: int=30
+    CHAT_AUTH_CACHE_MAX_ENTRIES: int=100000
+    CHAT_RATE_PER_SECOND: float=2.0
+    CHAT_RATE_BURST: int=10
+    CHAT_USER_RATE_PER_SECOND: float=5.0
+    CHAT_USER_RATE_BURST: int=20
+    CHAT_RATE_LIMIT_POLICY: str='reject'
+    CHAT_BANNED_TERMS_FILE: str=''
+    CHAT_MODERATION_ACTION: str='mask'
+    CHAT_MODERATION_RELOAD_SECONDS: int=30
+    CHAT_PARTITION_MONTHS_AHEAD: int=3
+    CHAT_PARTITION_JOB_SECONDS: int=6 * 3600
+    CHAT_ARCHIVE_AFTER_MONTHS: int=6
+    CHAT_ARCHIVE_TABLESPACE: str=''
+    
+    WEBHOOK_CONSUMER_BATCH_SIZE: int=50
+    WEBHOOK_CONSUMER_POLL_SECONDS: float=5.0
+    WEBHOOK_MAX_ATTEMPTS: int=8
+    WEBHOOK_RETRY_BASE_SECONDS: int=10
+    
     class Config:
         env_file = '.env'
         
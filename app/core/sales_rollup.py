@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import Date, cast, delete, func, literal, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.timeutils import utcnow
+from app.models.sales import EventSalesDaily
+from app.models.ticket import Ticket
+from app.models.event import Event
+
+
+def bump_sales_rollup(
+    db: Session,
+    event_id: int,
+    manager_id: Optional[int],
+    at: Optional[datetime],
+    tickets_sold: int = 0,
+    gross_amount: Decimal = Decimal("0"),
+    tickets_refunded: int = 0,
+    refunded_amount: Decimal = Decimal("0"),
+) -> None:
+    # Called inside the payment/refund transaction, so the rollup commits or
+    # rolls back together with the ticket change it describes.
+    now = utcnow()
+    stmt = insert(EventSalesDaily).values(
+        event_id=event_id,
+        manager_id=manager_id,
+        day=(at or now).astimezone(timezone.utc).date(),
+        tickets_sold=tickets_sold,
+        gross_amount=gross_amount,
+        tickets_refunded=tickets_refunded,
+        refunded_amount=refunded_amount,
+        updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["event_id", "day"],
+        set_={
+            "tickets_sold": EventSalesDaily.tickets_sold + stmt.excluded.tickets_sold,
+            "gross_amount": EventSalesDaily.gross_amount + stmt.excluded.gross_amount,
+            "tickets_refunded": EventSalesDaily.tickets_refunded + stmt.excluded.tickets_refunded,
+            "refunded_amount": EventSalesDaily.refunded_amount + stmt.excluded.refunded_amount,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+
+
+def rebuild_sales_rollup(db: Session, event_id: Optional[int] = None) -> int:
+    now = utcnow()
+
+    # Block concurrent bumps until the rebuilt rows commit, otherwise a sale
+    # committed mid-rebuild could be counted twice or not at all.
+    db.execute(text("LOCK TABLE event_sales_daily IN EXCLUSIVE MODE"))
+
+    clear = delete(EventSalesDaily)
+    if event_id is not None:
+        clear = clear.where(EventSalesDaily.event_id == event_id)
+    db.execute(clear)
+
+    sold_day = cast(func.timezone("UTC", Ticket.purchases_at), Date)
+    sold = (
+        select(
+            Ticket.event_id,
+            Event.manager_id,
+            sold_day,
+            func.sum(Ticket.quantity),
+            func.sum(Ticket.total_price),
+            literal(0),
+            literal(0),
+            literal(now),
+        )
+        .join(Event, Event.id == Ticket.event_id)
+        .where(Ticket.payment_status.in_(["paid", "refunded"]))
+        .group_by(Ticket.event_id, Event.manager_id, sold_day)
+    )
+
+    refund_day = cast(func.timezone("UTC", Ticket.refund_at), Date)
+    refunded = (
+        select(
+            Ticket.event_id,
+            Event.manager_id,
+            refund_day,
+            literal(0),
+            literal(0),
+            func.sum(Ticket.quantity),
+            func.sum(Ticket.total_price),
+            literal(now),
+        )
+        .join(Event, Event.id == Ticket.event_id)
+        .where(Ticket.payment_status == "refunded", Ticket.refund_at.isnot(None))
+        .group_by(Ticket.event_id, Event.manager_id, refund_day)
+    )
+
+    if event_id is not None:
+        sold = sold.where(Ticket.event_id == event_id)
+        refunded = refunded.where(Ticket.event_id == event_id)
+
+    columns = ["event_id", "manager_id", "day", "tickets_sold", "gross_amount", "tickets_refunded", "refunded_amount", "updated_at"]
+    db.execute(insert(EventSalesDaily).from_select(columns, sold))
+
+    refund_rows = insert(EventSalesDaily).from_select(columns, refunded)
+    db.execute(refund_rows.on_conflict_do_update(
+        index_elements=["event_id", "day"],
+        set_={
+            "tickets_refunded": refund_rows.excluded.tickets_refunded,
+            "refunded_amount": refund_rows.excluded.refunded_amount,
+        },
+    ))
+
+    count = db.query(func.count(EventSalesDaily.id))
+    if event_id is not None:
+        count = count.filter(EventSalesDaily.event_id == event_id)
+    return count.scalar() or 0
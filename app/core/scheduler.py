@@ -0,0 +1,103 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+JobFunc = Callable[[], Awaitable[int]]
+
+
+class ScheduledJob:
+
+    def __init__(self, name: str, func: JobFunc, interval_seconds: float):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.total_runs = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration_seconds: Optional[float] = None
+        self.last_rows_processed: Optional[int] = None
+        self.total_rows_processed = 0
+        self.last_error: Optional[str] = None
+
+    async def run_once(self) -> None:
+        self.running = True
+        self.last_started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            rows = await self.func()
+            self.last_rows_processed = rows
+            self.total_rows_processed += rows
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Scheduled job {self.name} failed: {e}")
+        finally:
+            self.last_duration_seconds = round(time.perf_counter() - started, 3)
+            self.total_runs += 1
+            self.running = False
+
+    async def loop(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "running": self.running,
+            "total_runs": self.total_runs,
+            "last_started_at": self.last_started_at,
+            "last_duration_seconds": self.last_duration_seconds,
+            "last_rows_processed": self.last_rows_processed,
+            "total_rows_processed": self.total_rows_processed,
+            "last_error": self.last_error,
+        }
+
+
+
+
+class Scheduler:
+
+    def __init__(self):
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.started = False
+
+    def add_job(self, name: str, func: JobFunc, interval_seconds: float) -> ScheduledJob:
+        job = ScheduledJob(name, func, interval_seconds)
+        self.jobs[name] = job
+        if self.started:
+            job.task = asyncio.create_task(job.loop())
+        return job
+
+    def run_now(self, name: str) -> None:
+        job = self.jobs.get(name)
+        if job is not None and self.started and not job.running:
+            asyncio.create_task(job.run_once())
+
+    def start(self) -> None:
+        self.started = True
+        for job in self.jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(job.loop())
+
+    async def stop(self) -> None:
+        self.started = False
+        for job in self.jobs.values():
+            if job.task is None:
+                continue
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+            job.task = None
+
+    def stats(self) -> List[dict]:
+        return [job.stats() for job in self.jobs.values()]
+
+
+scheduler = Scheduler()
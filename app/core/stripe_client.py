@@ -0,0 +1,59 @@
+import asyncio
+from typing import Optional
+import stripe
+from app.core.config import settings
+
+
+# One long-lived httpx.AsyncClient underneath, so calls reuse keep-alive connections
+http_client = stripe.HTTPXClient(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+
+stripe_client = stripe.StripeClient(
+    settings.STRIPE_SECRET_KEY,
+    http_client=http_client,
+    max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    base_addresses={"api": settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None,
+)
+
+stripe_slots = asyncio.Semaphore(settings.STRIPE_MAX_CONCURRENCY)
+
+
+
+
+def request_options(idempotency_key: Optional[str] = None) -> Optional[dict]:
+    if not idempotency_key:
+        return None
+    return {"idempotency_key": idempotency_key}
+
+
+
+
+async def create_checkout_session_async(params: dict, idempotency_key: Optional[str] = None):
+    async with stripe_slots:
+        return await stripe_client.v1.checkout.sessions.create_async(params=params, options=request_options(idempotency_key))
+
+
+
+
+async def retrieve_checkout_session_async(session_id: str):
+    async with stripe_slots:
+        return await stripe_client.v1.checkout.sessions.retrieve_async(session_id)
+
+
+
+
+async def expire_checkout_session_async(session_id: str):
+    async with stripe_slots:
+        return await stripe_client.v1.checkout.sessions.expire_async(session_id)
+
+
+
+
+async def create_refund_async(params: dict, idempotency_key: Optional[str] = None):
+    async with stripe_slots:
+        return await stripe_client.v1.refunds.create_async(params=params, options=request_options(idempotency_key))
+
+
+
+
+async def close_stripe_client() -> None:
+    await http_client.close_async()
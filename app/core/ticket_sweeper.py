@@ -0,0 +1,113 @@
+import asyncio
+from datetime import timedelta
+from typing import List, Optional, Tuple
+import stripe
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.timeutils import utcnow
+from app.core.stripe_client import retrieve_checkout_session_async
+from app.core.webhook_inbox import handle_checkout_session_completed
+from app.database import SessionLocal
+from app.models.ticket import Ticket
+
+
+def claim_stale_pending_tickets(db: Session, after_id: int, limit: int) -> List[Tuple[int, Optional[str]]]:
+    # Claims a batch by stamping a short lease and committing, so the row locks
+    # are gone before any Stripe call; sweepers on other workers skip tickets
+    # with a live lease, and the webhook handlers never wait on the sweep.
+    now = utcnow()
+    cutoff = now - timedelta(minutes=settings.TICKET_SWEEP_GRACE_MINUTES)
+    lifetime = timedelta(minutes=settings.STRIPE_SESSION_LIFETIME_MINUTES)
+    lease_expired = now - timedelta(seconds=settings.TICKET_SWEEP_CLAIM_SECONDS)
+    claimed = (
+        db.query(Ticket.id, Ticket.stripe_session_id)
+        .filter(
+            Ticket.payment_status == "pending",
+            Ticket.id > after_id,
+            or_(
+                Ticket.stripe_session_expires_at < cutoff,
+                and_(Ticket.stripe_session_expires_at.is_(None), Ticket.purchases_at < cutoff - lifetime),
+            ),
+            or_(Ticket.sweep_claimed_at.is_(None), Ticket.sweep_claimed_at < lease_expired),
+        )
+        .order_by(Ticket.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if claimed:
+        db.query(Ticket).filter(Ticket.id.in_([row.id for row in claimed])).update({Ticket.sweep_claimed_at: now}, synchronize_session=False)
+    db.commit()
+    return [(row.id, row.stripe_session_id) for row in claimed]
+
+
+
+
+async def check_session(session_id: Optional[str], slots: asyncio.Semaphore) -> Tuple[str, Optional[str]]:
+    if not session_id:
+        return "cancelled", None
+
+    async with slots:
+        try:
+            session = await retrieve_checkout_session_async(session_id)
+        except stripe.error.InvalidRequestError as e:
+            if e.code == "resource_missing":
+                return "cancelled", None
+            return "unknown", None
+        except stripe.error.StripeError:
+            return "unknown", None
+
+    if session.status == "complete" and session.payment_status == "paid":
+        return "paid", session.payment_intent
+    if session.status == "expired":
+        return "cancelled", None
+    return "unknown", None
+
+
+
+
+def apply_session_results(db: Session, claimed: List[Tuple[int, Optional[str]]], results: List[Tuple[str, Optional[str]]]) -> None:
+    # Each change re-checks the ticket is still pending; a webhook may have
+    # settled it while Stripe was being asked
+    for (ticket_id, session_id), (outcome, payment_intent_id) in zip(claimed, results):
+        if outcome == "paid":
+            handle_checkout_session_completed(db, {"id": session_id, "payment_intent": payment_intent_id})
+        elif outcome == "cancelled":
+            db.query(Ticket).filter(Ticket.id == ticket_id, Ticket.payment_status == "pending").update({Ticket.payment_status: "cancelled"}, synchronize_session=False)
+
+    # Tickets Stripe could not answer for are picked up again by the next sweep
+    db.query(Ticket).filter(Ticket.id.in_([ticket_id for ticket_id, _ in claimed])).update({Ticket.sweep_claimed_at: None}, synchronize_session=False)
+    db.commit()
+
+
+
+
+async def sweep_stale_pending_tickets() -> int:
+    batch_size = settings.TICKET_SWEEP_BATCH_SIZE
+    slots = asyncio.Semaphore(settings.TICKET_SWEEP_STRIPE_CONCURRENCY)
+    processed = 0
+    last_id = 0
+
+    for _ in range(settings.TICKET_SWEEP_MAX_BATCHES):
+        db = SessionLocal()
+        try:
+            claimed = await run_in_threadpool(claim_stale_pending_tickets, db, last_id, batch_size)
+            if not claimed:
+                break
+            last_id = claimed[-1][0]
+
+            results = await asyncio.gather(*(check_session(session_id, slots) for _, session_id in claimed))
+            await run_in_threadpool(apply_session_results, db, claimed, list(results))
+            processed += len(claimed)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if len(claimed) < batch_size:
+            break
+
+    return processed
@@ -0,0 +1,182 @@
+import asyncio
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.timeutils import utcnow
+from app.database import SessionLocal
+from app.models.webhook import StripeWebhookEvent
+from app.models.ticket import Ticket
+from app.models.event import Event
+from app.core.chat.provisioning import provision_chatrooms
+from app.core.chat.auth_cache import chat_auth_cache
+from app.core.sales_rollup import bump_sales_rollup
+from app.core.bulk_refund import queue_refund_job
+
+
+def enqueue_webhook_event(db: Session, stripe_event_id: str, event_type: str, payload: dict) -> bool:
+    # Stripe retries deliver the same event id, the unique index turns them into no-ops
+    now = utcnow()
+    stmt = (
+        insert(StripeWebhookEvent)
+        .values(
+            stripe_event_id=stripe_event_id,
+            event_type=event_type,
+            payload=payload,
+            status="pending",
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=[StripeWebhookEvent.stripe_event_id])
+        .returning(StripeWebhookEvent.id)
+    )
+    inserted_id = db.execute(stmt).scalar_one_or_none()
+    db.commit()
+    return inserted_id is not None
+
+
+
+
+def handle_checkout_session_completed(db: Session, session: dict) -> None:
+    ticket = db.query(Ticket).filter(Ticket.stripe_session_id == session.get("id")).with_for_update().first()
+    if not ticket or ticket.payment_status not in ("pending", "cancelled"):
+        return
+
+    ticket.payment_status = "paid"
+    ticket.stripe_payment_intent_id = session.get("payment_intent")
+    ticket.purchases_at = utcnow()
+
+    event = db.query(Event).filter(Event.id == ticket.event_id).first()
+    if not event:
+        return
+    event.tickets_sold = Event.tickets_sold + ticket.quantity
+    bump_sales_rollup(db, event.id, event.manager_id, ticket.purchases_at, tickets_sold=ticket.quantity, gross_amount=ticket.total_price)
+
+    # Paid after the event was cancelled: booked as a sale like any other and
+    # refunded by the event's refund job, which also undoes the counts above
+    if not event.is_active:
+        queue_refund_job(db, event.id)
+        return
+
+    provision_chatrooms(db, [(ticket.event_id, event.manager_id, ticket.user_id)])
+    chat_auth_cache.invalidate_after_commit(db, [ticket.user_id])
+
+
+
+
+def handle_checkout_session_expired(db: Session, session: dict) -> None:
+    ticket = db.query(Ticket).filter(Ticket.stripe_session_id == session.get("id")).with_for_update().first()
+    if ticket and ticket.payment_status == "pending":
+        ticket.payment_status = "cancelled"
+        chat_auth_cache.invalidate_after_commit(db, [ticket.user_id])
+
+
+
+
+WEBHOOK_HANDLERS: Dict[str, Callable[[Session, dict], None]] = {
+    "checkout.session.completed": handle_checkout_session_completed,
+    "checkout.session.expired": handle_checkout_session_expired,
+}
+
+
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.WEBHOOK_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+
+
+
+
+def process_pending_webhooks(limit: int) -> int:
+    # SKIP LOCKED lets several workers drain the inbox without ever handing the
+    # same event to two of them; inside a batch events run in arrival order.
+    db = SessionLocal()
+    try:
+        now = utcnow()
+        rows = (
+            db.query(StripeWebhookEvent)
+            .filter(
+                StripeWebhookEvent.status == "pending",
+                StripeWebhookEvent.next_attempt_at <= now,
+            )
+            .order_by(StripeWebhookEvent.created_at.asc(), StripeWebhookEvent.id.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        for row in rows:
+            handler = WEBHOOK_HANDLERS.get(row.event_type)
+            try:
+                with db.begin_nested():
+                    if handler:
+                        handler(db, row.payload["data"]["object"])
+                row.status = "processed"
+                row.processed_at = utcnow()
+                row.last_error = None
+            except Exception as e:
+                row.attempts += 1
+                row.last_error = str(e)
+                if row.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                    row.status = "failed"
+                else:
+                    row.next_attempt_at = utcnow() + retry_delay(row.attempts)
+
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+
+
+class WebhookConsumer:
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        batch_size = settings.WEBHOOK_CONSUMER_BATCH_SIZE
+
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await run_in_threadpool(process_pending_webhooks, batch_size)
+            except Exception as e:
+                print(f"Webhook consumer error: {e}")
+                processed = 0
+
+            if processed >= batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.WEBHOOK_CONSUMER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+webhook_consumer = WebhookConsumer()
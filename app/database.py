@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from supabase import Client, create_client
 
@@ -16,6 +17,33 @@ db_engine = create_engine(
 SessionLocal = sessionmaker(bind=db_engine, autocommit=False, autoflush=False)
 
 
+def async_database_url(url: str):
+    # Same database, async driver: asyncpg for Postgres, aiosqlite for local sqlite
+    url = make_url(url)
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, connect_args
+
+
+async_url, async_connect_args = async_database_url(settings.DATABASE_URL)
+
+async_engine = create_async_engine(
+    async_url,
+    connect_args=async_connect_args,
+    pool_pre_ping=True,
+    echo=settings.DEBUG if hasattr(settings, "DEBUG") else False,
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -5,7 +5,16 @@ from pydantic import ValidationError
 from fastapi.responses import JSONResponse
 from app.api.routes.auth import router
 from app.core.startup import ensure_admin_user
-from app.database import init_db
+from app.database import async_engine, init_db
+from app.core.webhook_inbox import webhook_consumer
+from app.core.stripe_client import close_stripe_client
+from app.core.scheduler import scheduler
+from app.core.ticket_sweeper import sweep_stale_pending_tickets
+from app.core.bulk_refund import resume_refund_jobs
+from app.core.chat.writer import message_writer
+from app.core.chat.moderation import chat_moderator
+from app.core.chat.partitions import archive_cold_chat_partitions, ensure_chat_partitions
+from app.core.config import settings
 from app.api.routes import auth, eventManager, event, admin, chat, payment
 from app.schemas.CommonResponse import ApiResponse
 
@@ -50,6 +59,27 @@ async def pydantic_validation_exception_handler(request: Request, exc: Validatio
 async def startup():
     init_db()            
     ensure_admin_user()  
+    webhook_consumer.start()
+    scheduler.add_job("ticket_sweeper", sweep_stale_pending_tickets, settings.TICKET_SWEEP_INTERVAL_SECONDS)
+    scheduler.add_job("refund_jobs", resume_refund_jobs, settings.REFUND_JOB_POLL_SECONDS)
+    scheduler.add_job("chat_heartbeat", chat.manager.heartbeat, settings.CHAT_PING_INTERVAL_SECONDS)
+    scheduler.add_job("chat_moderation_reload", chat_moderator.reload_if_changed, settings.CHAT_MODERATION_RELOAD_SECONDS)
+    scheduler.add_job("chat_partitions", ensure_chat_partitions, settings.CHAT_PARTITION_JOB_SECONDS)
+    scheduler.add_job("chat_archive", archive_cold_chat_partitions, settings.CHAT_PARTITION_JOB_SECONDS)
+    scheduler.add_job("chat_pending_purge", message_writer.purge_stale, settings.CHAT_PENDING_PURGE_SECONDS)
+    scheduler.start()
+    message_writer.start()
+    await chat.manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat.manager.stop()
+    await message_writer.stop()
+    await scheduler.stop()
+    await webhook_consumer.stop()
+    await close_stripe_client()
+    await async_engine.dispose()
 
 
 
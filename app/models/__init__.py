@@ -1,8 +1,11 @@
 from app.models.auth import User
 from app.models.eventManager import EventManager
 from app.models.event import Event, EventImage
-from app.models.chat import Chatroom, ChatMessage
+from app.models.chat import Chatroom, ChatMessage, PendingChatMessage
 from app.models.ticket import Ticket
+from app.models.webhook import StripeWebhookEvent
+from app.models.refund import EventRefundJob
+from app.models.sales import EventSalesDaily
 
 
 __all__ = [
@@ -12,5 +15,8 @@ __all__ = [
     "EventImage",
     "Chatroom",
     "ChatMessage",
-    "Ticket"
+    "Ticket",
+    "StripeWebhookEvent",
+    "EventRefundJob",
+    "EventSalesDaily"
 ]
\ No newline at end of file
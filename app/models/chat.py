@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, BigInteger, String, ForeignKey, DateTime, Index, Text
+from sqlalchemy import DDL, Boolean, Column, BigInteger, String, ForeignKey, DateTime, Index, Sequence, Text, event, false, text
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from app.models.base import Base, TimestampMixin
 
 
@@ -10,6 +11,13 @@ class Chatroom(Base, TimestampMixin):
     event_id = Column(BigInteger, ForeignKey("events.id", ondelete="CASCADE"), nullable=False, index=True)
     manager_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    last_message_id = Column(BigInteger, nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    user_unread_count = Column(BigInteger, default=0, server_default="0", nullable=False)
+    manager_unread_count = Column(BigInteger, default=0, server_default="0", nullable=False)
+    user_last_read_id = Column(BigInteger, default=0, server_default="0", nullable=False)
+    manager_last_read_id = Column(BigInteger, default=0, server_default="0", nullable=False)
     
     
     event = relationship("Event", back_populates="chatrooms")
@@ -27,12 +35,20 @@ class Chatroom(Base, TimestampMixin):
 class ChatMessage(Base, TimestampMixin):
     __tablename__ = "chat_messages"
     
-    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
-    room_id = Column(BigInteger, ForeignKey("chatrooms.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Ids come from chat_messages_id_seq only, one nextval per message (see
+    # ChatMessageWriter). A partitioned table cannot enforce a unique index
+    # without created_at, so the composite key does not make id unique on its
+    # own: nothing may insert an id that did not come from the sequence.
+    id = Column(BigInteger, Sequence("chat_messages_id_seq"), primary_key=True, index=True)
+    room_id = Column(BigInteger, ForeignKey("chatrooms.id", ondelete="CASCADE"), nullable=False)
     sender_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     recipient_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     content = Column(Text, nullable=False)
     is_read = Column(Boolean, default=False, nullable=False)
+    is_flagged = Column(Boolean, default=False, server_default=false(), nullable=False)
+    # Partition key, so part of the primary key; partitions are managed by
+    # app.core.chat.partitions
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), primary_key=True, nullable=False)
     
     room = relationship("Chatroom", back_populates="messages")
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
@@ -41,7 +57,46 @@ class ChatMessage(Base, TimestampMixin):
     
     __table_args__ = (
         Index('ix_chat_messages_sender_recipient', 'sender_id', 'recipient_id'),
+        Index('ix_chat_messages_room_id_id', 'room_id', 'id'),
+        Index('ix_chat_messages_flagged', 'id', postgresql_where=text('is_flagged')),
+        # Must stay in step with SEARCH_CONFIG in app.core.chat.search
+        Index('ix_chat_messages_content_fts', text("to_tsvector('english', content)"), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
     
     def __repr__(self):
-        return f"<ChatMessage(id={self.id}, room_id={self.room_id}, sender_id={self.sender_id}, recipient_id={self.recipient_id}, content='{self.content}', is_read={self.is_read})>"
\ No newline at end of file
+        return f"<ChatMessage(id={self.id}, room_id={self.room_id}, sender_id={self.sender_id}, recipient_id={self.recipient_id}, content='{self.content}', is_read={self.is_read})>"
+
+
+
+
+class PendingChatMessage(Base):
+    __tablename__ = "chat_pending_messages"
+
+    # One row per allocated message id until its batch is written or given up,
+    # across every worker; replay and the recent buffer wait on these instead
+    # of reading a room whose broadcast messages are not in chat_messages yet
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    room_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_chat_pending_messages_room_id_id', 'room_id', 'id'),
+    )
+
+
+
+
+# Local sqlite databases search through an FTS5 index kept in step by triggers
+for ddl in (
+    "CREATE VIRTUAL TABLE chat_messages_fts USING fts5(content, content='chat_messages', content_rowid='id')",
+    "CREATE TRIGGER chat_messages_fts_ai AFTER INSERT ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER chat_messages_fts_ad AFTER DELETE ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER chat_messages_fts_au AFTER UPDATE OF content ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content); END",
+):
+    event.listen(ChatMessage.__table__, "after_create", DDL(ddl).execute_if(dialect="sqlite"))
+
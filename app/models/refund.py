@@ -0,0 +1,31 @@
+from sqlalchemy import Column, BigInteger, String, DateTime, ForeignKey, Text, Index
+from sqlalchemy.orm import relationship
+from app.models.base import Base, TimestampMixin
+
+
+class EventRefundJob(Base, TimestampMixin):
+    __tablename__ = "event_refund_jobs"
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    event_id = Column(BigInteger, ForeignKey("events.id", ondelete="CASCADE"), nullable=False, index=True)
+    requested_by = Column(BigInteger, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String, default="pending", nullable=False)
+    total_tickets = Column(BigInteger, default=0, nullable=False)
+    refunded_tickets = Column(BigInteger, default=0, nullable=False)
+    failed_tickets = Column(BigInteger, default=0, nullable=False)
+    last_ticket_id = Column(BigInteger, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+    event = relationship("Event")
+
+
+    __table_args__ = (
+        Index("ix_event_refund_jobs_status_heartbeat", "status", "heartbeat_at"),
+    )
+
+    def __repr__(self):
+        return f"<EventRefundJob(id={self.id}, event_id={self.event_id}, status='{self.status}', refunded={self.refunded_tickets}/{self.total_tickets})>"
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, BigInteger, Date, DateTime, ForeignKey, Numeric, Index
+from datetime import datetime, timezone
+from app.models.base import Base
+
+
+class EventSalesDaily(Base):
+    __tablename__ = "event_sales_daily"
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    event_id = Column(BigInteger, ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    manager_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    day = Column(Date, nullable=False)
+    tickets_sold = Column(BigInteger, default=0, nullable=False)
+    gross_amount = Column(Numeric(precision=14, scale=2), default=0, nullable=False)
+    tickets_refunded = Column(BigInteger, default=0, nullable=False)
+    refunded_amount = Column(Numeric(precision=14, scale=2), default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+    __table_args__ = (
+        Index("uq_event_sales_daily_event_day", "event_id", "day", unique=True),
+        Index("ix_event_sales_daily_manager_day", "manager_id", "day"),
+    )
+
+    def __repr__(self):
+        return f"<EventSalesDaily(event_id={self.event_id}, day={self.day}, tickets_sold={self.tickets_sold}, tickets_refunded={self.tickets_refunded})>"
@@ -15,8 +15,12 @@ class Ticket(Base, TimestampMixin):
     purchases_at = Column(DateTime(timezone=True), nullable=False)
     
     stripe_session_id = Column(String, unique=True, nullable=True, index=True)
+    stripe_checkout_url = Column(String, nullable=True)
+    stripe_session_expires_at = Column(DateTime(timezone=True), nullable=True)
     stripe_payment_intent_id = Column(String, nullable=True, index=True)
     payment_status = Column(String, default="pending", nullable=True, index=True)
+    # Lease taken by the stale-ticket sweeper while it asks Stripe about the session
+    sweep_claimed_at = Column(DateTime(timezone=True), nullable=True)
     
     refund_id = Column(String, unique=True, nullable=True, index=True)
     refund_at = Column(DateTime(timezone=True), nullable=True)
@@ -27,6 +31,9 @@ class Ticket(Base, TimestampMixin):
     __table_args__ = (
         CheckConstraint('quantity > 0', name='check_ticket_quantity_positive'),
         CheckConstraint('total_price > 0', name='check_ticket_total_price_positive'),
+        Index("ix_tickets_user_purchases_at", "user_id", "purchases_at"),
+        Index("ix_tickets_user_event_payment_status", "user_id", "event_id", "payment_status"),
+        Index("ix_tickets_active_user_event", "user_id", "event_id", postgresql_where=(refund_at.is_(None) & refund_id.is_(None) & (payment_status == "paid"))),
         Index("uq_event_user_active_ticket", "event_id", "user_id", unique=True, postgresql_where=(refund_at.is_(None) & (payment_status.in_(["paid", "succeeded"])))),
     )
     
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, BigInteger, String, DateTime, Text, JSON, Index
+from datetime import datetime, timezone
+from app.models.base import Base, TimestampMixin
+
+
+class StripeWebhookEvent(Base, TimestampMixin):
+    __tablename__ = "stripe_webhook_events"
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    stripe_event_id = Column(String, unique=True, nullable=False, index=True)
+    event_type = Column(String, nullable=False, index=True)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(BigInteger, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+    __table_args__ = (
+        Index("ix_stripe_webhook_events_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<StripeWebhookEvent(id={self.id}, stripe_event_id='{self.stripe_event_id}', event_type='{self.event_type}', status='{self.status}')>"
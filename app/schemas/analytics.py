@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import date
+
+
+class SalesDayOut(BaseModel):
+    day: date
+    tickets_sold: int
+    gross_amount: float
+    tickets_refunded: int
+    refunded_amount: float
+    net_amount: float
+
+
+class EventSalesOut(BaseModel):
+    event_id: int
+    tickets_sold: int
+    gross_amount: float
+    tickets_refunded: int
+    refunded_amount: float
+    net_amount: float
+
+
+class EventSalesSeriesOut(BaseModel):
+    event_id: int
+    days: List[SalesDayOut]
@@ -29,11 +29,55 @@ class ChatRoomOut(BaseModel):
     event_title: str
     other_user_id: int
     other_username: str
+    last_message_id: Optional[int] = None
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
+    last_activity_at: datetime
+    unread_count: int = 0
+
+
+class ChatRoomPages(BaseModel):
+    items: List[ChatRoomOut]
+    next_before_activity_at: Optional[datetime] = None
+    next_before_id: Optional[int] = None
+    has_more: bool = False
     
 
 class MessagePages(BaseModel):
     items: List[MessageOut]
     next_before_id: Optional[int] = None
-    has_more: bool = False
\ No newline at end of file
+    next_after_id: Optional[int] = None
+    has_more: bool = False
+
+
+class MarkReadRequest(BaseModel):
+    up_to_id: int
+
+    @validator('up_to_id')
+    def up_to_id_positive(cls, v):
+        if v <= 0:
+            raise ValueError('up_to_id must be a positive integer')
+        return v
+
+
+class ReadReceiptOut(BaseModel):
+    room_id: int
+    reader_id: int
+    last_read_id: int
+    unread_count: int
+
+
+class MessageSearchHit(BaseModel):
+    id: int
+    room_id: int
+    sender_id: Optional[int] = None
+    sender_name: Optional[str] = None
+    # Content excerpt with the matched terms wrapped in <mark>...</mark>
+    snippet: str
+    created_at: datetime
+
+
+class MessageSearchPages(BaseModel):
+    items: List[MessageSearchHit]
+    next_before_id: Optional[int] = None
+    has_more: bool = False
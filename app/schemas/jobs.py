@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class JobStatusOut(BaseModel):
+    name: str
+    interval_seconds: float
+    running: bool
+    total_runs: int
+    last_started_at: Optional[datetime] = None
+    last_duration_seconds: Optional[float] = None
+    last_rows_processed: Optional[int] = None
+    total_rows_processed: int
+    last_error: Optional[str] = None
+
+
+
+class ChatConnectionsOut(BaseModel):
+    connections: int
+    users: int
+    rooms: int
+    room_subscriptions: int
+    queued_frames: int
+    dropped_frames: int
+    reaped_connections: int
+    rejected_connections: int
+    rate_limited_frames: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -31,6 +31,32 @@ class TicketResponse(BaseModel):
         
         
         
+class TicketPages(BaseModel):
+    items: List[TicketResponse]
+    next_before_purchases_at: Optional[datetime] = None
+    next_before_id: Optional[int] = None
+    has_more: bool = False
+        
+        
+        
 class CheckoutSessionResponse(BaseModel):
     session_id: str
-    checkout_url: str
\ No newline at end of file
+    checkout_url: str
+        
+        
+        
+class RefundJobOut(BaseModel):
+    id: int
+    event_id: int
+    status: str
+    total_tickets: int
+    refunded_tickets: int
+    failed_tickets: int
+    last_error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime
+    
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,9 @@
+"""Create missing chatrooms for paid tickets.
+
+    python -m scripts.backfill_chatrooms
+"""
+from app.core.chat.provisioning import backfill_chatrooms
+
+
+if __name__ == "__main__":
+    print(f"✅ Chatrooms created: {backfill_chatrooms()}")
@@ -0,0 +1,113 @@
+"""Minimal local stand-in for the Stripe API, for manual testing and load runs.
+
+    uvicorn scripts.fake_stripe:app --port 12111
+    STRIPE_API_BASE=http://localhost:12111 uvicorn app.main:app
+
+FAKE_STRIPE_LATENCY_MS adds an artificial delay to every response so slow
+Stripe round trips can be reproduced locally.
+"""
+import asyncio
+import os
+import secrets
+import time
+from typing import Dict
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+app = FastAPI()
+
+LATENCY_SECONDS = float(os.getenv("FAKE_STRIPE_LATENCY_MS", "0")) / 1000
+
+sessions: Dict[str, dict] = {}
+refunds: Dict[str, dict] = {}
+idempotent_responses: Dict[str, dict] = {}
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{secrets.token_hex(12)}"
+
+
+
+
+def nested_form(form) -> dict:
+    # Stripe encodes nested params as line_items[0][price_data][currency]=usd
+    result: dict = {}
+    for key, value in form.multi_items():
+        parts = key.replace("]", "").split("[")
+        node = result
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return result
+
+
+
+
+async def respond(request: Request, build) -> JSONResponse:
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+
+    key = request.headers.get("Idempotency-Key")
+    if key and key in idempotent_responses:
+        return JSONResponse(idempotent_responses[key])
+
+    body = build(nested_form(await request.form()))
+    if key:
+        idempotent_responses[key] = body
+    return JSONResponse(body)
+
+
+
+
+@app.post("/v1/checkout/sessions")
+async def create_session(request: Request):
+    def build(params: dict) -> dict:
+        session_id = new_id("cs_test")
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"http://localhost/checkout/{session_id}",
+            "status": "open",
+            "payment_status": "unpaid",
+            "payment_intent": None,
+            "expires_at": int(params.get("expires_at") or time.time() + 3600),
+            "metadata": params.get("metadata", {}),
+        }
+        sessions[session_id] = session
+        return session
+
+    return await respond(request, build)
+
+
+
+
+@app.get("/v1/checkout/sessions/{session_id}")
+async def retrieve_session(session_id: str):
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    session = sessions.get(session_id)
+    if not session:
+        return JSONResponse(
+            status_code=404,
+            content={"error": {"type": "invalid_request_error", "code": "resource_missing", "message": f"No such checkout.session: '{session_id}'"}},
+        )
+    return JSONResponse(session)
+
+
+
+
+@app.post("/v1/refunds")
+async def create_refund(request: Request):
+    def build(params: dict) -> dict:
+        refund = {
+            "id": new_id("re_test"),
+            "object": "refund",
+            "amount": int(params.get("amount") or 0),
+            "payment_intent": params.get("payment_intent"),
+            "status": "succeeded",
+        }
+        refunds[refund["id"]] = refund
+        return refund
+
+    return await respond(request, build)
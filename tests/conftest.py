@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+# Settings are read at import time; everything below runs against a throwaway sqlite file
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+for name, value in {
+    "DATABASE_URL": f"sqlite:///{DB_PATH}",
+    "SUPABASE_ANON_KEY": "test",
+    "PROJECT_URL": "http://localhost",
+    "SECRET_KEY": "test",
+    "ADMIN_EMAIL": "admin@example.com",
+    "ADMIN_PASSWORD": "test",
+    "EMAIL_HOST": "localhost",
+    "EMAIL_USER": "test",
+    "EMAIL_PASSWORD": "test",
+    "EMAIL_FROM": "noreply@example.com",
+    "CLOUDINARY_CLOUD_NAME": "test",
+    "CLOUDINARY_API_KEY": "test",
+    "CLOUDINARY_API_SECRET": "test",
+    "STRIPE_SECRET_KEY": "sk_test",
+    "STRIPE_PUBLISHABLE_KEY": "pk_test",
+    "STRIPE_WEBHOOK_SECRET": "whsec_test",
+    "FRONTEND_URL": "http://localhost",
+    "CHAT_BACKPLANE": "memory",
+}.items():
+    os.environ[name] = value
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+
+# sqlite only auto-increments an INTEGER PRIMARY KEY
+@compiles(BigInteger, "sqlite")
+def compile_big_integer(type_, compiler, **kw):
+    return "INTEGER"
+
+
+import app.models
+from app.database import SessionLocal, db_engine
+from app.models.base import Base
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(db_engine)
+    yield
+    db_engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with db_engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def client():
+    # Startup hooks (scheduler, chat backplane, admin seeding) are not run
+    from fastapi.testclient import TestClient
+    from app.main import app
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def login():
+    from app.api.deps import get_current_user
+    from app.main import app
+
+    def as_user(user):
+        app.dependency_overrides[get_current_user] = lambda: {"email": user.email, "role": user.role, "id": user.id}
+    return as_user
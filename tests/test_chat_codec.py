@@ -0,0 +1,54 @@
+import json
+import msgpack
+from app.core.chat.codec import JSON_PROTOCOL, MSGPACK_PROTOCOL, choose_subprotocol, pack_frame, stamp_packed, unpack_frame
+
+
+FRAME = {
+    "success": True,
+    "statusCode": 200,
+    "message": "New message",
+    "data": {"id": 7, "room_id": 3, "sender_id": 1, "sender_name": "buyer", "content": "hi", "created_at": "2026-01-02T03:04:05.678000+00:00"},
+}
+
+
+def test_msgpack_is_preferred_when_offered():
+    assert choose_subprotocol([JSON_PROTOCOL, MSGPACK_PROTOCOL]) == MSGPACK_PROTOCOL
+    assert choose_subprotocol([JSON_PROTOCOL]) == JSON_PROTOCOL
+    assert choose_subprotocol(["chat.xml"]) is None
+
+
+def test_packed_frames_use_short_keys_and_epoch_millis():
+    packed = msgpack.unpackb(pack_frame(json.dumps(FRAME)), raw=False)
+
+    assert packed["m"] == "New message"
+    assert packed["d"]["x"] == "hi"
+    assert packed["d"]["ts"] == 1767323045678
+
+
+def test_unpack_restores_the_long_keys():
+    frame = unpack_frame(pack_frame(json.dumps(FRAME)))
+
+    assert frame["data"]["content"] == "hi"
+    assert frame["data"]["created_at"] == 1767323045678
+    assert {key: frame[key] for key in ("success", "statusCode", "message")} == {"success": True, "statusCode": 200, "message": "New message"}
+
+
+def test_stamp_splices_seq_and_room_into_the_map_header():
+    packed = pack_frame(json.dumps(FRAME))
+    stamped = stamp_packed(packed, 42, 3)
+
+    # Same body after the header, two more entries in front
+    assert stamped.endswith(packed[1:])
+    frame = unpack_frame(stamped)
+    assert list(frame)[:2] == ["seq", "room_id"]
+    assert (frame["seq"], frame["room_id"]) == (42, 3)
+    assert unpack_frame(stamp_packed(packed, 43, None))["seq"] == 43
+    assert "room_id" not in unpack_frame(stamp_packed(packed, 43, None))
+
+
+def test_stamp_repacks_maps_too_big_for_a_fixmap():
+    packed = pack_frame(json.dumps({f"k{n}": n for n in range(14)}))
+    frame = unpack_frame(stamp_packed(packed, 1, 9))
+
+    assert (frame["seq"], frame["room_id"]) == (1, 9)
+    assert all(frame[f"k{n}"] == n for n in range(14))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+import pytest
+from app.core.timeutils import utcnow
+from app.models import Chatroom, ChatMessage, Event, User
+
+
+@pytest.fixture
+def room(db):
+    user = User(username="buyer", email="buyer@example.com", hashed_password="x")
+    manager = User(username="host", email="host@example.com", hashed_password="x", role="manager")
+    db.add_all([user, manager])
+    db.commit()
+    now = utcnow()
+    event = Event(manager_id=manager.id, title="Show", location="Hall", ticket_price=10, ticket_limit=100, event_date=now + timedelta(days=7))
+    db.add(event)
+    db.commit()
+    room = Chatroom(event_id=event.id, manager_id=manager.id, user_id=user.id, created_at=now)
+    db.add(room)
+    db.commit()
+    # Ids come from the writer's sequence in production; sqlite needs them spelled out
+    db.add_all([
+        ChatMessage(id=n, room_id=room.id, sender_id=user.id, recipient_id=manager.id, content=f"m{n}", created_at=now + timedelta(seconds=n))
+        for n in range(1, 8)
+    ])
+    db.commit()
+    return room, user, manager
+
+
+def test_before_and_after_together_are_rejected(client, login, room):
+    chatroom, user, _ = room
+    login(user)
+
+    body = client.get(f"/chat/rooms/{chatroom.id}/messages", params={"before_id": 5, "after_id": 2}).json()
+    assert body["success"] is False
+    assert body["statusCode"] == 400
+
+
+def test_outsiders_cannot_read_the_room(client, login, db, room):
+    chatroom, _, _ = room
+    outsider = User(username="other", email="other@example.com", hashed_password="x")
+    db.add(outsider)
+    db.commit()
+    login(outsider)
+
+    assert client.get(f"/chat/rooms/{chatroom.id}/messages").json()["statusCode"] == 403
+
+
+def test_paging_backwards_and_catching_up(client, login, room):
+    chatroom, user, _ = room
+    login(user)
+    url = f"/chat/rooms/{chatroom.id}/messages"
+
+    newest = client.get(url, params={"limit": 3}).json()["data"]
+    assert [item["id"] for item in newest["items"]] == [5, 6, 7]
+    assert newest["items"][0]["sender_name"] == "buyer"
+    assert newest["next_before_id"] == 5
+
+    older = client.get(url, params={"limit": 3, "before_id": newest["next_before_id"]}).json()["data"]
+    assert [item["id"] for item in older["items"]] == [2, 3, 4]
+    assert older["has_more"] is True
+
+    missed = client.get(url, params={"limit": 3, "after_id": 2}).json()["data"]
+    assert [item["id"] for item in missed["items"]] == [3, 4, 5]
+    assert missed["next_after_id"] == 5
+
+    rest = client.get(url, params={"limit": 3, "after_id": 5}).json()["data"]
+    assert [item["id"] for item in rest["items"]] == [6, 7]
+    assert rest["has_more"] is False
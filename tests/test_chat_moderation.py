@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from app.core.chat.moderation import ChatModerator, TermMatcher
+from app.core.config import settings
+
+
+def spans(terms, text):
+    return [text[start:end] for start, end in TermMatcher(terms).find(text)]
+
+
+def test_matches_whole_words_only():
+    assert spans(["ass"], "ass, class, assess, bad ass") == ["ass", "ass"]
+
+
+def test_matching_ignores_case():
+    assert spans(["Darn"], "DARN it, darn") == ["DARN", "darn"]
+
+
+def test_overlapping_terms_are_all_found():
+    # Classic Aho-Corasick set: the fail links carry "he" and "hers" matches
+    assert spans(["he", "she", "his", "hers"], "she said he is his, not hers") == ["she", "he", "his", "hers"]
+
+
+def test_the_longest_term_ending_at_a_word_wins():
+    assert spans(["bar", "foo bar"], "foo bar") == ["foo bar"]
+
+
+def test_offsets_survive_characters_that_lower_case_to_two():
+    # "İ" lower-cases to two characters; spans still index the original text
+    text = "İİ darn"
+    assert [text[start:end] for start, end in TermMatcher(["darn"]).find(text)] == ["darn"]
+
+
+def test_blank_terms_are_ignored():
+    matcher = TermMatcher(["", "  ", "darn", "darn"])
+    assert matcher.size == 1
+
+
+@pytest.fixture
+def moderator(tmp_path, monkeypatch):
+    terms = tmp_path / "terms.txt"
+    terms.write_text("# comment\ndarn\n\nheck\n", encoding="utf-8")
+    monkeypatch.setattr(settings, "CHAT_BANNED_TERMS_FILE", str(terms))
+    moderator = ChatModerator()
+    assert asyncio.run(moderator.reload_if_changed()) == 2
+    return moderator
+
+
+def test_reload_skips_an_unchanged_file(moderator):
+    assert asyncio.run(moderator.reload_if_changed()) == 0
+
+
+@pytest.mark.parametrize("action, expected", [
+    ("mask", ("oh **** it", False)),
+    ("flag", ("oh darn it", True)),
+    ("reject", (None, False)),
+])
+def test_actions(moderator, monkeypatch, action, expected):
+    monkeypatch.setattr(settings, "CHAT_MODERATION_ACTION", action)
+    assert moderator.check("oh darn it") == expected
+    assert moderator.check("all clean") == ("all clean", False)
@@ -0,0 +1,46 @@
+import pytest
+from app.core.chat import rate_limit
+from app.core.chat.rate_limit import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_a_full_bucket_allows_a_burst_then_refuses(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_tokens_refill_at_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.take()
+
+    clock[0] += 0.25
+    assert bucket.take() is False
+    clock[0] += 0.25
+    assert bucket.take() is True
+    assert bucket.take() is False
+
+
+def test_refill_never_exceeds_the_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    bucket.take()
+
+    clock[0] += 60
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_give_back_returns_a_token_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=1)
+    assert bucket.take() is True
+
+    bucket.give_back()
+    bucket.give_back()
+    assert bucket.tokens == 1
+    assert [bucket.take(), bucket.take()] == [True, False]
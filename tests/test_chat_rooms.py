@@ -0,0 +1,45 @@
+from datetime import timedelta
+from app.core.timeutils import utcnow
+from app.models import Chatroom, Event, User
+
+
+def seed_rooms(db, count):
+    user = User(username="buyer", email="buyer@example.com", hashed_password="x")
+    manager = User(username="host", email="host@example.com", hashed_password="x", role="manager")
+    db.add_all([user, manager])
+    db.commit()
+    now = utcnow()
+    for n in range(count):
+        event = Event(manager_id=manager.id, title=f"Show {n}", location="Hall", ticket_price=10, ticket_limit=100, event_date=now + timedelta(days=7))
+        db.add(event)
+        db.commit()
+        db.add(Chatroom(event_id=event.id, manager_id=manager.id, user_id=user.id, last_message_id=n + 1, last_message_preview=f"hi {n}", last_message_at=now - timedelta(minutes=n)))
+    db.commit()
+    return user, manager
+
+
+def test_half_a_cursor_is_rejected(client, login, db):
+    user, _ = seed_rooms(db, 1)
+    login(user)
+
+    for params in ({"before_id": 5}, {"before_activity_at": utcnow().isoformat()}):
+        body = client.get("/chat/rooms", params=params).json()
+        assert body["success"] is False
+        assert body["statusCode"] == 422
+
+
+def test_pages_follow_the_cursor_by_latest_activity(client, login, db):
+    user, manager = seed_rooms(db, 5)
+    login(user)
+
+    previews = []
+    params = {"limit": 2}
+    while True:
+        data = client.get("/chat/rooms", params=params).json()["data"]
+        previews += [item["last_message"] for item in data["items"]]
+        assert all(item["other_user_id"] == manager.id for item in data["items"])
+        if not data["has_more"]:
+            break
+        params = {"limit": 2, "before_activity_at": data["next_before_activity_at"], "before_id": data["next_before_id"]}
+
+    assert previews == [f"hi {n}" for n in range(5)]
@@ -0,0 +1,41 @@
+from datetime import timedelta
+from decimal import Decimal
+from app.core.timeutils import utcnow
+from app.models import Event, Ticket, User
+
+
+def test_half_a_cursor_is_rejected(client, login, db):
+    user = User(username="buyer", email="buyer@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    login(user)
+
+    for params in ({"before_id": 5}, {"before_purchases_at": utcnow().isoformat()}):
+        body = client.get("/payments/my-tickets", params=params).json()
+        assert body["success"] is False
+        assert body["statusCode"] == 422
+
+
+def test_pages_follow_the_cursor_newest_first(client, login, db):
+    user = User(username="buyer", email="buyer@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    now = utcnow()
+    for n in range(5):
+        event = Event(title=f"Show {n}", location="Hall", ticket_price=10, ticket_limit=100, event_date=now + timedelta(days=7))
+        db.add(event)
+        db.commit()
+        db.add(Ticket(event_id=event.id, user_id=user.id, quantity=1, total_price=Decimal("10.00"), purchases_at=now - timedelta(minutes=n), payment_status="paid"))
+    db.commit()
+    login(user)
+
+    titles = []
+    params = {"limit": 2}
+    while True:
+        data = client.get("/payments/my-tickets", params=params).json()["data"]
+        titles += [item["event_title"] for item in data["items"]]
+        if not data["has_more"]:
+            break
+        params = {"limit": 2, "before_purchases_at": data["next_before_purchases_at"], "before_id": data["next_before_id"]}
+
+    assert titles == [f"Show {n}" for n in range(5)]
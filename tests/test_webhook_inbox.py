@@ -0,0 +1,89 @@
+from datetime import timedelta
+from decimal import Decimal
+import pytest
+from app.core import webhook_inbox
+from app.core.config import settings
+from app.core.timeutils import utcnow
+from app.core.webhook_inbox import enqueue_webhook_event, process_pending_webhooks, retry_delay
+from app.models import Chatroom, Event, StripeWebhookEvent, Ticket, User
+
+
+def completed(session_id: str) -> dict:
+    return {"data": {"object": {"id": session_id, "payment_intent": f"pi_{session_id}"}}}
+
+
+@pytest.fixture
+def pending_ticket(db):
+    user = User(username="buyer", email="buyer@example.com", hashed_password="x")
+    manager = User(username="host", email="host@example.com", hashed_password="x", role="manager")
+    db.add_all([user, manager])
+    db.commit()
+    event = Event(manager_id=manager.id, title="Show", location="Hall", ticket_price=10, ticket_limit=100, event_date=utcnow() + timedelta(days=7))
+    db.add(event)
+    db.commit()
+    ticket = Ticket(event_id=event.id, user_id=user.id, quantity=2, total_price=Decimal("20.00"), purchases_at=utcnow(), stripe_session_id="cs_1", payment_status="pending")
+    db.add(ticket)
+    db.commit()
+    return ticket
+
+
+def test_retry_delay_doubles_from_the_base():
+    base = settings.WEBHOOK_RETRY_BASE_SECONDS
+    assert [retry_delay(attempts) for attempts in (1, 2, 3, 4)] == [timedelta(seconds=base * factor) for factor in (1, 2, 4, 8)]
+
+
+def test_enqueue_ignores_a_redelivered_event(db):
+    assert enqueue_webhook_event(db, "evt_1", "checkout.session.completed", completed("cs_1")) is True
+    assert enqueue_webhook_event(db, "evt_1", "checkout.session.completed", completed("cs_1")) is False
+    assert db.query(StripeWebhookEvent).count() == 1
+
+
+def test_processing_marks_the_ticket_paid_once(db, pending_ticket):
+    enqueue_webhook_event(db, "evt_1", "checkout.session.completed", completed("cs_1"))
+    enqueue_webhook_event(db, "evt_1", "checkout.session.completed", completed("cs_1"))
+
+    assert process_pending_webhooks(10) == 1
+    assert process_pending_webhooks(10) == 0
+
+    db.expire_all()
+    ticket = db.get(Ticket, pending_ticket.id)
+    event = db.get(Event, pending_ticket.event_id)
+    row = db.query(StripeWebhookEvent).one()
+    assert ticket.payment_status == "paid"
+    assert ticket.stripe_payment_intent_id == "pi_cs_1"
+    assert event.tickets_sold == 2
+    assert row.status == "processed" and row.processed_at is not None
+    assert db.query(Chatroom).filter(Chatroom.event_id == event.id, Chatroom.user_id == ticket.user_id).count() == 1
+
+
+def test_unknown_event_types_are_marked_processed(db):
+    enqueue_webhook_event(db, "evt_2", "customer.created", {"data": {"object": {}}})
+
+    assert process_pending_webhooks(10) == 1
+    assert db.query(StripeWebhookEvent).one().status == "processed"
+
+
+def test_a_failing_handler_backs_off_then_gives_up(db, monkeypatch):
+    def broken(db, session):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(webhook_inbox.WEBHOOK_HANDLERS, "checkout.session.completed", broken)
+    enqueue_webhook_event(db, "evt_3", "checkout.session.completed", completed("cs_3"))
+
+    before = utcnow()
+    assert process_pending_webhooks(10) == 1
+    db.expire_all()
+    row = db.query(StripeWebhookEvent).one()
+    assert (row.status, row.attempts, row.last_error) == ("pending", 1, "boom")
+    assert row.next_attempt_at.replace(tzinfo=before.tzinfo) >= before + retry_delay(1)
+
+    # Not due yet
+    assert process_pending_webhooks(10) == 0
+
+    for attempts in range(2, settings.WEBHOOK_MAX_ATTEMPTS + 1):
+        row.next_attempt_at = utcnow()
+        db.commit()
+        assert process_pending_webhooks(10) == 1
+        db.expire_all()
+        row = db.query(StripeWebhookEvent).one()
+        assert row.attempts == attempts
+    assert row.status == "failed"